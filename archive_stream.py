@@ -0,0 +1,109 @@
+import tarfile
+import zlib
+
+TAR_BLOCK_SIZE = 512
+
+
+def _parse_pax_records(data: bytes) -> dict:
+    """Parses 'LEN key=value\\n' records from a pax extended header."""
+    records = {}
+    pos = 0
+    while pos < len(data):
+        space = data.find(b" ", pos)
+        if space == -1:
+            break
+        try:
+            length = int(data[pos:space])
+        except ValueError:
+            break
+        if length <= 0:
+            break
+        record = data[space + 1:pos + length - 1] # Drop the trailing newline
+        key, _, value = record.partition(b"=")
+        records[key.decode("utf-8", "replace")] = value.decode("utf-8", "replace")
+        pos += length
+    return records
+
+
+class TarGzStreamReader:
+    """
+    Incremental reader for a .tar.gz byte stream.
+    Feed it compressed chunks as they arrive; it yields (path, data) for the regular files that
+    `want(path, size)` accepts, and skips every other member without keeping its bytes.
+    Nothing is written to disk and at most one selected member is buffered at a time.
+    """
+
+    def __init__(self, want, strip_components: int = 0):
+        self.want = want
+        self.strip_components = strip_components
+        self.finished = False
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        self._member = None # (path, remaining_bytes, padding, keep, kind), kind is "file", "pax" or "longname"
+        self._member_data = bytearray()
+        self._pending_path = None # From pax 'x' / GNU 'L' headers, applies to the next member
+        self._zero_blocks = 0
+
+    def _member_path(self, header_name: str) -> str:
+        parts = header_name.split("/")
+        return "/".join(parts[self.strip_components:])
+
+    def feed(self, compressed_chunk: bytes):
+        """Consumes a chunk of compressed data and returns the list of completed (path, data) members."""
+        if self.finished:
+            return []
+        self._buffer += self._decompressor.decompress(compressed_chunk)
+        completed = []
+        while not self.finished:
+            if self._member is not None:
+                path, remaining, padding, keep, kind = self._member
+                take = min(remaining, len(self._buffer))
+                if keep and take:
+                    self._member_data += self._buffer[:take]
+                del self._buffer[:take]
+                remaining -= take
+                if remaining:
+                    self._member = (path, remaining, padding, keep, kind)
+                    break
+                if len(self._buffer) < padding:
+                    self._member = (path, 0, padding, keep, kind)
+                    break
+                del self._buffer[:padding]
+                self._member = None
+                if kind == "pax":
+                    self._pending_path = _parse_pax_records(bytes(self._member_data)).get("path", self._pending_path)
+                elif kind == "longname":
+                    self._pending_path = bytes(self._member_data).rstrip(b"\0").decode("utf-8", "replace")
+                elif keep:
+                    completed.append((path, bytes(self._member_data)))
+                self._member_data = bytearray()
+                continue
+
+            if len(self._buffer) < TAR_BLOCK_SIZE:
+                break
+            header_block = bytes(self._buffer[:TAR_BLOCK_SIZE])
+            del self._buffer[:TAR_BLOCK_SIZE]
+            if header_block == b"\0" * TAR_BLOCK_SIZE:
+                self._zero_blocks += 1
+                if self._zero_blocks >= 2:
+                    self.finished = True
+                continue
+            self._zero_blocks = 0
+            try:
+                info = tarfile.TarInfo.frombuf(header_block, "utf-8", "surrogateescape")
+            except tarfile.TarError as e:
+                print(f"Stopping archive read: invalid tar header ({e}).")
+                self.finished = True
+                break
+            padding = (-info.size) % TAR_BLOCK_SIZE
+            if info.type == tarfile.XHDTYPE:
+                self._member = (None, info.size, padding, True, "pax")
+            elif info.type == tarfile.GNUTYPE_LONGNAME:
+                self._member = (None, info.size, padding, True, "longname")
+            else:
+                header_name = self._pending_path or info.name
+                self._pending_path = None
+                path = self._member_path(header_name)
+                keep = info.isreg() and bool(path) and self.want(path, info.size)
+                self._member = (path, info.size, padding, keep, "file")
+        return completed
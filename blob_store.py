@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+
+from config import BLOB_STORE_ENABLED, BLOB_STORE_PATH, BLOB_STORE_MAX_BYTES
+
+TOUCH_RESOLUTION_SECONDS = 300 # A read re-stamps last_access only if the stored stamp is older than this
+
+
+class BlobStore:
+    """
+    Content-addressed store keyed by git blob SHA (SQLite).
+    Holds the decoded text of a blob (chunk embeddings live in the embedding cache, keyed by chunk text).
+    Total stored bytes are capped; least recently used blobs are evicted first.
+    Texts are read and written in batches (one query / one transaction per call); methods block on SQLite,
+    so async callers run them in a worker thread.
+    """
+
+    def __init__(self, db_path: str = BLOB_STORE_PATH, max_bytes: int = BLOB_STORE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS blobs (
+                    sha TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("DROP TABLE IF EXISTS blob_embeddings") # Left by older versions
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs(last_access)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        return self._conn
+
+    def get_texts(self, shas: list[str]) -> dict:
+        """Returns {sha: text} for the blob SHAs that are stored."""
+        shas = list(dict.fromkeys(sha for sha in shas if sha))
+        found, stale = {}, []
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            for start in range(0, len(shas), 500): # Stay under SQLite's bound-parameter limit
+                batch = shas[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for sha, text, last_access in conn.execute(
+                    f"SELECT sha, text, last_access FROM blobs WHERE sha IN ({placeholders})", batch
+                ):
+                    found[sha] = text
+                    if now - last_access >= TOUCH_RESOLUTION_SECONDS:
+                        stale.append((now, sha))
+            if stale:
+                conn.executemany("UPDATE blobs SET last_access = ? WHERE sha = ?", stale)
+                conn.commit()
+        return found
+
+    def put_texts(self, texts_by_sha: dict):
+        """Stores {sha: text} in one transaction; texts larger than the whole store are skipped."""
+        rows = [(sha, text, len(text.encode("utf-8"))) for sha, text in texts_by_sha.items() if sha and text is not None]
+        rows = [row for row in rows if row[2] <= self.max_bytes]
+        if not rows:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            for sha, text, size in rows:
+                old = conn.execute("SELECT size FROM blobs WHERE sha = ?", (sha,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO blobs (sha, text, size, last_access) VALUES (?, ?, ?, ?)",
+                    (sha, text, size, now),
+                )
+                self._total_bytes += size - (old[0] if old else 0)
+            self._evict_locked(conn)
+            conn.commit()
+
+    def _evict_locked(self, conn: sqlite3.Connection):
+        if self._total_bytes <= self.max_bytes:
+            return
+        removed = 0
+        for sha, text_size in conn.execute("SELECT sha, size FROM blobs ORDER BY last_access ASC").fetchall():
+            if self._total_bytes <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+            self._total_bytes -= text_size
+            removed += 1
+        print(f"Blob store: evicted {removed} blobs (now {self._total_bytes} bytes).")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+blob_store = BlobStore() if BLOB_STORE_ENABLED else None
@@ -0,0 +1,169 @@
+import numpy as np
+
+# Where a row's text lives: the memory-mapped chunk file of the last save, or the in-memory arena
+SOURCE_DISK = 0
+SOURCE_ARENA = 1
+NO_REPO = -1 # repo column value of deleted (or never assigned) rows
+
+
+class ChunkTable:
+    """
+    Columnar storage for vector store chunks, indexed directly by document ID.
+    Texts are UTF-8 bytes in one arena (or the memory-mapped chunk file of a saved store) addressed by
+    offset/length columns; repository names are interned once and referenced by int32 IDs.
+    A chunk costs 17 bytes of columns plus its text, instead of a dict, a str and a repeated repo name.
+    """
+
+    def __init__(self):
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._repos = np.zeros(0, dtype=np.int32)
+        self._sources = np.zeros(0, dtype=np.int8)
+        self._size = 0 # One past the highest document ID ever stored
+        self._live = 0
+        self._repo_names = []
+        self._repo_ids = {}
+        self._arena = bytearray()
+        self._arena_dead_bytes = 0
+        self._disk_text = b"" # mmap of the saved chunk file, if any
+        self._deleted_from_disk = [] # Saved doc IDs deleted since the last save
+        self._disk_cleared = False
+
+    @classmethod
+    def from_saved(cls, doc_ids, offsets, lengths, repos, repo_names, disk_text, size):
+        """Builds a table over saved chunks whose texts live in `disk_text` (an mmap or bytes)."""
+        table = cls()
+        table._ensure_capacity(size)
+        table._size = size
+        table._repos[:] = NO_REPO
+        table._offsets[doc_ids] = offsets
+        table._lengths[doc_ids] = lengths
+        table._repos[doc_ids] = repos
+        table._sources[doc_ids] = SOURCE_DISK
+        table._live = len(doc_ids)
+        table._repo_names = list(repo_names)
+        table._repo_ids = {name: i for i, name in enumerate(table._repo_names)}
+        table._disk_text = disk_text
+        return table
+
+    def _ensure_capacity(self, size: int):
+        capacity = len(self._offsets)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 1024)
+        for column in ("_offsets", "_lengths", "_repos", "_sources"):
+            old = getattr(self, column)
+            grown = np.zeros(new_capacity, dtype=old.dtype)
+            grown[:capacity] = old
+            if column == "_repos":
+                grown[capacity:] = NO_REPO
+            setattr(self, column, grown)
+
+    def intern_repo(self, repo_full_name: str) -> int:
+        repo_id = self._repo_ids.get(repo_full_name)
+        if repo_id is None:
+            repo_id = self._repo_ids[repo_full_name] = len(self._repo_names)
+            self._repo_names.append(repo_full_name)
+        return repo_id
+
+    def append(self, first_doc_id: int, texts: list[str], repo_names: list[str]):
+        """Stores texts under consecutive document IDs starting at `first_doc_id`."""
+        self._ensure_capacity(first_doc_id + len(texts))
+        for i, (text, repo_name) in enumerate(zip(texts, repo_names)):
+            doc_id = first_doc_id + i
+            if self._repos[doc_id] != NO_REPO:
+                self.delete([doc_id])
+            encoded = text.encode("utf-8")
+            self._offsets[doc_id] = len(self._arena)
+            self._lengths[doc_id] = len(encoded)
+            self._repos[doc_id] = self.intern_repo(repo_name)
+            self._sources[doc_id] = SOURCE_ARENA
+            self._arena += encoded
+            self._live += 1
+        self._size = max(self._size, first_doc_id + len(texts))
+
+    def delete(self, doc_ids):
+        """Removes chunks; unknown IDs are ignored. Returns the number removed."""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        doc_ids = doc_ids[(doc_ids >= 0) & (doc_ids < self._size)]
+        doc_ids = doc_ids[self._repos[doc_ids] != NO_REPO]
+        if not len(doc_ids):
+            return 0
+        on_disk = self._sources[doc_ids] == SOURCE_DISK
+        self._deleted_from_disk.extend(doc_ids[on_disk].tolist())
+        self._arena_dead_bytes += int(self._lengths[doc_ids[~on_disk]].sum())
+        self._repos[doc_ids] = NO_REPO
+        self._live -= len(doc_ids)
+        if self._arena_dead_bytes > max(len(self._arena) // 2, 1 << 20):
+            self._compact_arena()
+        return len(doc_ids)
+
+    def _compact_arena(self):
+        arena_rows = np.nonzero((self._sources[:self._size] == SOURCE_ARENA) & (self._repos[:self._size] != NO_REPO))[0]
+        compacted = bytearray()
+        for doc_id in arena_rows:
+            offset, length = int(self._offsets[doc_id]), int(self._lengths[doc_id])
+            self._offsets[doc_id] = len(compacted)
+            compacted += self._arena[offset:offset + length]
+        self._arena = compacted
+        self._arena_dead_bytes = 0
+
+    def __contains__(self, doc_id) -> bool:
+        return 0 <= doc_id < self._size and self._repos[doc_id] != NO_REPO
+
+    def __len__(self) -> int:
+        return self._live
+
+    def text(self, doc_id: int) -> str:
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        offset, length = int(self._offsets[doc_id]), int(self._lengths[doc_id])
+        source = self._arena if self._sources[doc_id] == SOURCE_ARENA else self._disk_text
+        return bytes(source[offset:offset + length]).decode("utf-8")
+
+    def repo(self, doc_id: int) -> str:
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        return self._repo_names[self._repos[doc_id]]
+
+    def doc_ids(self, repo_full_name: str = None) -> np.ndarray:
+        """Live document IDs, optionally only those of one repository."""
+        repos = self._repos[:self._size]
+        if repo_full_name is None:
+            return np.nonzero(repos != NO_REPO)[0]
+        repo_id = self._repo_ids.get(repo_full_name)
+        if repo_id is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.nonzero(repos == repo_id)[0]
+
+    def clear(self):
+        had_disk_rows = bool(np.any((self._sources[:self._size] == SOURCE_DISK) & (self._repos[:self._size] != NO_REPO)))
+        self._repos[:] = NO_REPO
+        self._live = 0
+        self._arena = bytearray()
+        self._arena_dead_bytes = 0
+        self._deleted_from_disk = []
+        self._disk_cleared = self._disk_cleared or had_disk_rows
+
+    @property
+    def dirty(self) -> bool:
+        """True if chunks were added or removed since the table was built."""
+        return bool(len(self._arena) or self._deleted_from_disk or self._disk_cleared)
+
+    def stats(self) -> dict:
+        column_bytes = sum(column.nbytes for column in (self._offsets, self._lengths, self._repos, self._sources))
+        repo_name_bytes = sum(len(name) for name in self._repo_names)
+        live_text_bytes = int(self._lengths[self.doc_ids()].sum()) if self._live else 0
+        resident_bytes = column_bytes + len(self._arena) + repo_name_bytes
+        return {
+            "chunks": self._live,
+            "id_slots": self._size,
+            "repositories": len(self._repo_names),
+            "text_bytes": live_text_bytes,
+            "arena_bytes": len(self._arena),
+            "arena_dead_bytes": self._arena_dead_bytes,
+            "mapped_text_bytes": len(self._disk_text),
+            "column_bytes": column_bytes,
+            "resident_bytes": resident_bytes,
+            "resident_bytes_per_chunk": round(resident_bytes / self._live, 1) if self._live else 0.0,
+        }
@@ -16,9 +16,6 @@ DEFAULT_EMBEDDING_DIMENSION = 384
 GITHUB_API_BASE_URL = "https://api.github.com"
 
 # --- CV Generation & Processing Configuration ---
-# Max repos to initially FETCH and display for user selection
-MAX_REPOS_TO_DISPLAY_FOR_SELECTION = 50 # Adjust as needed, mindful of initial load
-
 # For "Auto-Select Top N" feature:
 # How many of the most recent repos to *process* (embed & send to Gemini)
 AUTO_SELECT_PROCESS_COUNT = 5 # e.g., process the top 5
@@ -38,6 +35,13 @@ TEXT_CHUNK_SIZE_CHARS = 1500
 TEXT_CHUNK_OVERLAP_CHARS = 200
 
 MAX_CONTEXT_CHUNKS_FOR_GEMINI_CV_GENERATION = 8
+# Retrieval queries, one per CV section; all are embedded in one batch and searched together per repo
+CONTEXT_RETRIEVAL_FACET_QUERIES = [
+    "Overview and purpose of the project {repo}",
+    "Key features and technical accomplishments of {repo}",
+    "Technologies, frameworks, languages and libraries used in {repo}",
+    "Architecture, main components and code structure of {repo}",
+]
 
 # --- Application Configuration ---
 APP_TITLE = "GitHub CV Assistant"
@@ -45,6 +49,143 @@ APP_VERSION = "0.5.0"
 
 # Only relevant if USE_LOCAL_EMBEDDINGS is False
 GEMINI_EMBEDDING_MODEL_NAME = 'models/embedding-001' 
+# Texts per batch embedding request (the API accepts up to 100), batches in flight at once,
+# and retries of failed items (each retry quarters the batch size, isolating items that keep failing)
+GEMINI_EMBEDDING_BATCH_SIZE = 100
+GEMINI_EMBEDDING_MAX_CONCURRENCY = 4
+GEMINI_EMBEDDING_MAX_RETRIES = 3
+GEMINI_EMBEDDING_RETRY_BACKOFF_SECONDS = 2
 
 # Local Embedding Specific Configuration
 LOCAL_EMBEDDING_BATCH_SIZE = 16
+# One worker thread owns the model; requests from concurrent jobs arriving within the window
+# are coalesced (up to the max) into one length-sorted encode.
+LOCAL_EMBEDDING_WORKER_ENABLED = True
+LOCAL_EMBEDDING_BATCH_WINDOW_MS = 10
+LOCAL_EMBEDDING_MAX_COALESCED_TEXTS = 512
+# Inference backend for the local model: "torch" (PyTorch) or "onnx" (ONNX Runtime, CPU; needs sentence-transformers[onnx])
+LOCAL_EMBEDDING_BACKEND = "torch"
+# ONNX only: dynamic int8 quantization target ("avx2", "avx512", "avx512_vnni", "arm64"), or None for fp32.
+# Uses the quantized file shipped with the model if present, otherwise exports one into LOCAL_EMBEDDING_ONNX_EXPORT_DIR.
+LOCAL_EMBEDDING_ONNX_QUANTIZATION = None
+LOCAL_EMBEDDING_ONNX_EXPORT_DIR = os.path.join(".cache", "onnx_models")
+LOCAL_EMBEDDING_NUM_THREADS = None # CPU threads for inference (torch or ONNX Runtime); None = library default
+
+# --- GitHub HTTP Client Configuration ---
+# One shared keep-alive pool is used for all GitHub traffic (api, raw and codeload hosts)
+GITHUB_HTTP2_ENABLED = True # Falls back to HTTP/1.1 if the 'h2' package is not installed
+GITHUB_HTTP_MAX_CONNECTIONS = 50
+GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS = 30
+# Max in-flight requests per host; hosts not listed use GITHUB_DEFAULT_HOST_CONCURRENCY
+GITHUB_PER_HOST_CONCURRENCY = {
+    "api.github.com": 8,
+    "raw.githubusercontent.com": 16,
+    "codeload.github.com": 4,
+}
+GITHUB_DEFAULT_HOST_CONCURRENCY = 8
+
+# --- GitHub Conditional Request Cache ---
+# Stores ETag/Last-Modified + body per (token, URL); unchanged data comes back as 304s,
+# which do not count against the GitHub rate limit.
+GITHUB_RESPONSE_CACHE_ENABLED = True
+GITHUB_RESPONSE_CACHE_PATH = os.path.join(".cache", "github_responses.sqlite3")
+GITHUB_RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+GITHUB_RESPONSE_CACHE_MAX_ENTRIES = 5000
+
+# --- Repository Context Ingestion ---
+# 'files': one raw download per selected file
+# 'archive': stream the repo tarball once and extract the selected files in memory
+# 'auto': use 'archive' when enough files are selected and the repo is small enough to stream
+GITHUB_CONTEXT_INGESTION_MODE = "auto"
+GITHUB_ARCHIVE_INGESTION_MIN_FILES = 4
+GITHUB_ARCHIVE_INGESTION_MAX_REPO_BYTES = 20 * 1024 * 1024
+
+# --- Content-Addressed Blob Store ---
+# Decoded file text keyed by git blob SHA, so unchanged files are not re-downloaded
+# (their chunks are not re-embedded either: see the embedding cache below).
+BLOB_STORE_ENABLED = True
+BLOB_STORE_PATH = os.path.join(".cache", "blobs.sqlite3")
+BLOB_STORE_MAX_BYTES = 512 * 1024 * 1024
+
+# --- Embedding Cache ---
+# Embeddings keyed by hash(text) + embedding model name, shared by the local and Gemini paths,
+# so unchanged chunks and repeated queries are never embedded twice.
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = os.path.join(".cache", "embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_BYTES = 256 * 1024 * 1024
+EMBEDDING_CACHE_MAX_ENTRIES = 500000
+EMBEDDING_CACHE_VECTOR_DTYPE = "float32" # "float16" halves the cache size at a small precision cost
+
+# --- Incremental CV Generation ---
+# Repos whose pushed_at has not moved since their last successful generation are served from
+# the stored CV entry, without any GitHub, embedding or Gemini calls.
+INCREMENTAL_CV_GENERATION = True
+CV_ENTRY_STORE_PATH = os.path.join(".cache", "cv_entries.sqlite3")
+
+# Max concurrent page requests when listing a user's repositories (pages 2..last)
+GITHUB_REPO_LIST_PAGE_CONCURRENCY = 4
+
+# --- GitHub Rate Limit Scheduling ---
+# Every GitHub request is paced against the token's X-RateLimit-Remaining / X-RateLimit-Reset budget.
+GITHUB_RATE_LIMIT_RESERVE = 20 # Below this many remaining calls, wait for the reset instead of spending them
+GITHUB_RATE_LIMIT_PACING_THRESHOLD = 500 # Below this, spread the remaining calls evenly until the reset
+GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS = 15 * 60 # Never queue a single call longer than this
+GITHUB_RATE_LIMIT_MAX_RETRIES = 5 # Retries for 403/429 rate-limit responses (primary or secondary)
+GITHUB_RATE_LIMIT_BACKOFF_BASE_SECONDS = 2
+GITHUB_RATE_LIMIT_BACKOFF_MAX_SECONDS = 120
+
+# --- Context File Selection ---
+# Files are scored from tree metadata alone and picked greedily by expected information per character
+# until MAX_CONSOLIDATED_TEXT_LENGTH_CHARS is spent. The overhead models the per-file download/header cost.
+CONTEXT_SELECTION_PER_FILE_OVERHEAD_CHARS = 1000
+CONTEXT_SELECTION_MIN_SCORE = 0.5 # Files scoring below this are never worth a download
+
+# --- Repository Browser ---
+# Directory listings are served from a per-repo tree cached by head commit SHA.
+REPO_BROWSER_TREE_CACHE_MAX_REPOS = 32
+REPO_BROWSER_HEAD_CHECK_TTL_SECONDS = 60 # How long a cached tree is trusted before re-checking the head commit
+REPO_BROWSER_PREFETCH_MAX_DIRS = 12 # Background prefetch fan-out (only used when GitHub truncates the tree)
+
+# --- Vector Index Configuration ---
+# Index structure per repository partition: 'flat' (exact scan), 'hnsw', 'ivfpq', or 'auto'
+# ('auto' stays flat until a partition reaches VECTOR_INDEX_ANN_THRESHOLD vectors, then rebuilds as VECTOR_INDEX_AUTO_ANN_MODE)
+VECTOR_INDEX_MODE = "auto"
+VECTOR_INDEX_AUTO_ANN_MODE = "hnsw"
+VECTOR_INDEX_ANN_THRESHOLD = 20000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_PQ_SUBQUANTIZERS = 48 # Must divide the embedding dimension (384 / 48 = 8 dims per sub-vector)
+IVF_PQ_BITS = 8
+IVF_NPROBE = 16
+IVF_MIN_POINTS_PER_LIST = 39 # FAISS's minimum training points per list; IVF is only built once this many exist
+
+# --- Vector Store Namespaces ---
+# Each user (GitHub token) gets its own vector store; stores unused for this long are dropped from memory
+VECTOR_STORE_NAMESPACE_IDLE_SECONDS = 1800
+VECTOR_STORE_MAX_NAMESPACES = 32
+
+# --- Vector Store Persistence ---
+# One directory per namespace under VECTOR_STORE_DIR; changed stores are saved periodically, on eviction and at shutdown
+VECTOR_STORE_DIR = os.path.join(".cache", "vector_stores")
+VECTOR_STORE_SAVE_INTERVAL_SECONDS = 60
+VECTOR_STORE_MMAP_INDEXES = True # Memory-map saved partition indexes instead of reading them into RAM
+VECTOR_STORE_COMPACT_DEAD_FRACTION = 0.5 # Rewrite the chunk files once this fraction of records is superseded
+
+# --- Vector Storage ---
+# Encoding of stored vectors: 'float32' (exact), 'float16' (2x smaller), 'int8' (4x, scalar quantized) or 'pq' (8x+, product quantized)
+VECTOR_STORAGE_MODE = "float32"
+# For lossy encodings, keep full-precision copies and re-score the top candidates exactly.
+# The copies are as large as float32 storage: they stay off the heap only in saved, memory-mapped partitions,
+# so rerank is applied only when VECTOR_STORE_MMAP_INDEXES is on and faiss can map them (>= 1.8).
+VECTOR_STORAGE_EXACT_RERANK = True
+VECTOR_RERANK_CANDIDATE_FACTOR = 4 # Candidates fetched per requested result before the exact rerank
+
+# --- Hybrid Retrieval ---
+# BM25 over each repo partition's chunks, fused with the vector ranking by reciprocal-rank fusion
+HYBRID_RETRIEVAL_ENABLED = True
+HYBRID_CANDIDATES_PER_QUERY = 50 # Depth of each ranking (vector and BM25) fed into the fusion
+HYBRID_RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
@@ -0,0 +1,120 @@
+import math
+import os
+import re
+
+from config import (
+    MAX_FILE_SIZE_FOR_CONTEXT_BYTES,
+    MAX_CONSOLIDATED_TEXT_LENGTH_CHARS,
+    CONTEXT_SELECTION_PER_FILE_OVERHEAD_CHARS,
+    CONTEXT_SELECTION_MIN_SCORE,
+)
+
+# Text file types worth sending to the context builder
+CONTEXT_FILE_EXTENSIONS = ('.py', '.js', '.ts', '.java', '.go', '.rb', '.php', '.md', '.txt',
+                           '.json', '.yaml', '.yml', '.xml', '.html', '.css', '.sh', '.R', '.scala', '.kt', '.swift', '.c', '.cpp', '.h', '.cs',
+                           '.tsx', '.jsx', '.rs', '.vue', '.svelte', '.dart', '.toml')
+
+# Relative value of a file type for describing a project
+SOURCE_EXTENSION_WEIGHTS = {
+    '.py': 5, '.js': 4, '.ts': 5, '.tsx': 5, '.jsx': 4, '.java': 5, '.go': 5, '.rb': 5, '.php': 4, '.rs': 5,
+    '.scala': 5, '.kt': 5, '.swift': 5, '.c': 4, '.cpp': 4, '.h': 2, '.cs': 5, '.R': 4, '.dart': 5,
+    '.vue': 4, '.svelte': 4, '.sh': 2, '.md': 3, '.txt': 1, '.html': 1.5, '.css': 0.5,
+    '.json': 1, '.yaml': 1.5, '.yml': 1.5, '.xml': 1, '.toml': 1.5,
+}
+
+# Manifests name the project's technologies in very few bytes
+MANIFEST_FILE_NAMES = {
+    "package.json", "requirements.txt", "pyproject.toml", "setup.py", "setup.cfg", "go.mod", "cargo.toml",
+    "pom.xml", "build.gradle", "build.gradle.kts", "gemfile", "composer.json", "dockerfile",
+    "docker-compose.yml", "docker-compose.yaml", "pubspec.yaml", "environment.yml",
+}
+
+ENTRY_POINT_STEMS = {"main", "app", "index", "server", "cli", "__main__", "manage", "application", "program", "lib", "mod"}
+
+# Paths that are generated, vendored or otherwise say little about the author's work
+EXCLUDED_PATH_PATTERN = re.compile(
+    r"(^|/)(node_modules|vendor|vendors|third_party|third-party|bower_components|dist|build|out|target|coverage|"
+    r"\.git|\.github|\.idea|\.vscode|__pycache__|\.venv|venv|env|site-packages|\.next|\.nuxt|public/assets|static/vendor)/",
+    re.IGNORECASE,
+)
+EXCLUDED_FILE_PATTERN = re.compile(
+    r"(\.min\.(js|css)$|\.map$|\.lock$|-lock\.(json|yaml)$|^package-lock\.json$|^yarn\.lock$|^pnpm-lock\.yaml$|"
+    r"^go\.sum$|_pb2(_grpc)?\.py$|\.pb\.go$|\.generated\.|\.g\.dart$|\.bundle\.js$|^license(\.\w+)?$|^copying$|"
+    r"^(changelog|changes|history|contributing|code_of_conduct|security|authors)(\.\w+)?$)",
+    re.IGNORECASE,
+)
+LOW_VALUE_DIR_PATTERN = re.compile(r"(^|/)(tests?|spec|__tests__|fixtures|examples?|samples?|docs?|migrations|scripts|data|assets)/", re.IGNORECASE)
+SOURCE_ROOT_DIRS = {"src", "lib", "app", "source", "pkg", "cmd", "internal"}
+
+
+def score_tree_entry(entry: dict) -> float:
+    """
+    Scores a tree blob by how much it is expected to tell about the project (0 = never select).
+    Uses path depth, extension, name, size and generated/vendored patterns; no content is needed.
+    """
+    path = entry.get("path", "")
+    name = os.path.basename(path)
+    name_lower = name.lower()
+    size = entry.get("size", 0)
+    if entry.get("type") != "blob" or size <= 0 or size > MAX_FILE_SIZE_FOR_CONTEXT_BYTES:
+        return 0.0
+    if EXCLUDED_PATH_PATTERN.search(path) or EXCLUDED_FILE_PATTERN.search(name):
+        return 0.0
+
+    stem, extension = os.path.splitext(name)
+    is_manifest = name_lower in MANIFEST_FILE_NAMES
+    if not (is_manifest or name_lower.endswith(CONTEXT_FILE_EXTENSIONS) or extension in CONTEXT_FILE_EXTENSIONS):
+        return 0.0
+
+    directories = path.split("/")[:-1]
+    if name_lower.startswith("readme"):
+        # The shallowest README is the project's front page
+        return 10.0 if not directories else 4.0 / len(directories)
+
+    weight = 4.0 if is_manifest else SOURCE_EXTENSION_WEIGHTS.get(extension, SOURCE_EXTENSION_WEIGHTS.get(extension.lower(), 1.0))
+    if stem.lower() in ENTRY_POINT_STEMS:
+        weight *= 1.6
+    if LOW_VALUE_DIR_PATTERN.search(path):
+        weight *= 0.35
+    # Source roots like src/ or cmd/ don't count as depth; beyond that, deeper files matter a bit less
+    effective_depth = len([d for d in directories if d.lower() not in SOURCE_ROOT_DIRS])
+    weight *= 1.0 / (1.0 + 0.25 * effective_depth)
+    return weight
+
+
+def select_context_files(tree_items: list[dict], budget_chars: int = MAX_CONSOLIDATED_TEXT_LENGTH_CHARS, max_files: int = 20):
+    """
+    Chooses which files to download, before downloading anything.
+    Expected information grows with size but with diminishing returns, so files are taken greedily by
+    information per character until the budget is spent. Each file is also charged a share of the budget
+    per file slot (budget / max_files), so the file-count limit is priced in and many tiny files don't win by default.
+    Returns tree items (with 'name' and 'score' added) in context order: highest score first.
+    """
+    per_file_overhead = max(CONTEXT_SELECTION_PER_FILE_OVERHEAD_CHARS, budget_chars // max(1, max_files))
+    candidates = []
+    for entry in tree_items:
+        score = score_tree_entry(entry)
+        if score < CONTEXT_SELECTION_MIN_SCORE:
+            continue
+        size = entry.get("size", 0)
+        information = score * math.log2(1 + size / 256)
+        cost = size + per_file_overhead
+        candidates.append((information / cost, information, cost, entry, score))
+
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    selected, spent, readme_taken = [], 0, False
+    for density, information, cost, entry, score in candidates:
+        if len(selected) >= max_files:
+            break
+        is_readme = os.path.basename(entry.get("path", "")).lower().startswith("readme") and score >= 10
+        if is_readme and readme_taken:
+            continue
+        if spent + entry.get("size", 0) > budget_chars:
+            continue
+        selected.append({**entry, "name": os.path.basename(entry.get("path", "")), "score": round(score, 3)})
+        spent += entry.get("size", 0)
+        readme_taken = readme_taken or is_readme
+
+    selected.sort(key=lambda item: item["score"], reverse=True)
+    print(f"Selected {len(selected)} of {len(candidates)} candidate files (~{spent} chars budgeted of {budget_chars}).")
+    return selected
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import threading
+import time
+
+from config import CV_ENTRY_STORE_PATH
+
+
+class CvEntryStore:
+    """
+    Per-repository record of the last successful CV generation (SQLite).
+    An entry is only reused when the repo's pushed_at and the generation model both match.
+    """
+
+    def __init__(self, db_path: str = CV_ENTRY_STORE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS cv_entries (
+                    repo_full_name TEXT PRIMARY KEY,
+                    pushed_at TEXT NOT NULL,
+                    generation_model TEXT NOT NULL,
+                    cv_entry TEXT NOT NULL,
+                    generated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_unchanged(self, repo_full_name: str, pushed_at: str, generation_model: str):
+        """Returns the stored CV entry if the repo has not been pushed to since it was generated, else None."""
+        if not repo_full_name or not pushed_at:
+            return None
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT cv_entry FROM cv_entries WHERE repo_full_name = ? AND pushed_at = ? AND generation_model = ?",
+                (repo_full_name, pushed_at, generation_model),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, repo_full_name: str, pushed_at: str, generation_model: str, cv_entry: str):
+        if not repo_full_name or not pushed_at or not cv_entry:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cv_entries (repo_full_name, pushed_at, generation_model, cv_entry, generated_at) VALUES (?, ?, ?, ?, ?)",
+                (repo_full_name, pushed_at, generation_model, cv_entry, time.time()),
+            )
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+cv_entry_store = CvEntryStore()
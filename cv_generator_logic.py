@@ -1,17 +1,52 @@
 import time
 from typing import Optional, List 
 import asyncio # Import asyncio for async generator
-from github_service import get_consolidated_repo_text_for_context
-from gemini_service import generate_cv_entry_for_project # Correct import
-from vector_store_service import vector_store # Use the global instance
+import numpy as np
+from github_service import get_repo_context_documents, format_context_document
+from github_client import github_client
+from gemini_service import generate_cv_entry_for_project, get_embeddings_batch
+from local_embedding_service import local_model_loader
+from vector_store_registry import vector_store_registry
+from github_response_cache import token_identity
+from cv_entry_store import cv_entry_store
 from utils import simple_chunk_text
 from config import (
     TEXT_CHUNK_SIZE_CHARS, TEXT_CHUNK_OVERLAP_CHARS,
     MAX_CONTEXT_CHUNKS_FOR_GEMINI_CV_GENERATION,
+    CONTEXT_RETRIEVAL_FACET_QUERIES,
     AUTO_SELECT_FINAL_OUTPUT_COUNT,
     GEMINI_API_GENERATION_DELAY_SECONDS, # Used inside gemini_service
+    INCREMENTAL_CV_GENERATION,
+    GENERATION_MODEL_NAME,
+    USE_LOCAL_EMBEDDINGS,
 )
 
+
+def embed_context_documents(documents: list[dict]):
+    """
+    Chunks each context document separately and embeds the chunks.
+    Chunks of unchanged files are served by the embedding cache (keyed by chunk text and model),
+    so they are not recomputed; it is the only cache of chunk embeddings.
+    Returns {"error", "chunks", "embeddings"}.
+    """
+    per_document_chunks = [
+        simple_chunk_text(format_context_document(document), TEXT_CHUNK_SIZE_CHARS, TEXT_CHUNK_OVERLAP_CHARS)
+        for document in documents
+    ]
+    texts = [chunk for document_chunks in per_document_chunks for chunk in document_chunks]
+    if not texts:
+        return {"error": None, "chunks": [], "embeddings": None}
+    embedding_results = get_embeddings_batch(texts)
+    embedded = embedding_results.get("embeddings")
+    if not embedded or len(embedded) != len(texts) or all(vector is None for vector in embedded):
+        return {"error": embedding_results["error"] or "Embedding count mismatch.", "chunks": [], "embeddings": None}
+    if embedding_results["error"]:
+        print(f"Continuing without {sum(1 for vector in embedded if vector is None)} chunks whose embedding failed: {embedding_results['error']}")
+    chunks = [chunk for chunk, vector in zip(texts, embedded) if vector is not None]
+    embeddings = np.asarray([vector for vector in embedded if vector is not None], dtype=np.float32)
+    print(f"Embedded {len(chunks)} chunks from {len(documents)} documents.")
+    return {"error": None, "chunks": chunks, "embeddings": embeddings}
+
 # Make the orchestration function an async generator
 async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list[dict], action_type: str):
     """
@@ -20,10 +55,8 @@ async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list
     `action_type` is 'manual_select' or 'auto_select'.
     This is an async generator function.
     """
-    # Reset vector store at the start of a new process
-    # This call is synchronous, but typically fast.
-    await asyncio.to_thread(vector_store.reset_index)
-    print("Session vector store reset for new CV generation request.")
+    # Each user's chunks live in their own vector store namespace, so concurrent jobs can't clobber each other
+    vector_store_namespace = token_identity(token)
 
     # Yield initial status
     total_repos = len(repos_to_process)
@@ -49,16 +82,27 @@ async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list
         repo_display_name = f"{owner}/{repo_name_only}"
         step_prefix = f"[{i+1}/{total_repos}] {repo_display_name}:"
 
+        if INCREMENTAL_CV_GENERATION:
+            stored_cv_entry = await asyncio.to_thread(cv_entry_store.get_unchanged, repo_display_name, pushed_at, GENERATION_MODEL_NAME)
+            if stored_cv_entry:
+                print(f"Repository {repo_display_name} unchanged since last generation (pushed_at {pushed_at}). Reusing stored CV entry.")
+                yield {"type": "status", "status": "cache_hit", "repo": repo_display_name, "message": f"{step_prefix} No changes since last run. Reusing previously generated CV entry."}
+                processed_results_for_filtering.append({"repo": repo_display_name, "pushed_at": pushed_at, "cv_entry": stored_cv_entry, "error": None, "cache_hit": True})
+                await asyncio.sleep(0.1)
+                continue
+
         print(f"\n--- Processing repository {i+1}/{total_repos}: {repo_display_name} for CV ---")
-        yield {"type": "status", "status": "processing_context", "repo": repo_display_name, "message": f"{step_prefix} Fetching and consolidating repository text..."}
+        github_budget = github_client.get_rate_limit_budget(token)
+        if github_budget["expected_wait_seconds"] >= 1:
+            yield {"type": "status", "status": "warning", "repo": repo_display_name, "github_budget": github_budget,
+                   "message": f"{step_prefix} GitHub API budget is low ({github_budget['remaining']} calls left, resets in {github_budget['reset_in_seconds']}s). Requests are queued; expect about {github_budget['expected_wait_seconds']:.0f}s of waiting."}
+        yield {"type": "status", "status": "processing_context", "repo": repo_display_name, "github_budget": github_budget, "message": f"{step_prefix} Fetching and consolidating repository text..."}
         await asyncio.sleep(0.1)
 
-        # get_consolidated_repo_text_for_context is synchronous
-        repo_text_content = await asyncio.to_thread(
-            get_consolidated_repo_text_for_context, token, owner, repo_name_only
-        )
+        # Awaited directly: GitHub calls go through the shared async client, not executor threads
+        context_documents = await get_repo_context_documents(token, owner, repo_name_only)
         
-        if not repo_text_content:
+        if not context_documents:
             err_msg = f"{step_prefix} Failed to retrieve or consolidate text content for context."
             print(err_msg)
             yield {"type": "status", "status": "error", "repo": repo_display_name, "message": err_msg}
@@ -66,13 +110,21 @@ async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list
             await asyncio.sleep(0.1)
             continue
         
+        if USE_LOCAL_EMBEDDINGS and local_model_loader.status()["status"] in ("not_started", "loading"):
+            yield {"type": "status", "status": "processing_context", "repo": repo_display_name, "message": f"{step_prefix} Waiting for the local embedding model to finish loading..."}
+            await asyncio.to_thread(local_model_loader.get_model)
         yield {"type": "status", "status": "processing_context", "repo": repo_display_name, "message": f"{step_prefix} Chunking text and adding to vector store..."}
-        # Chunk the text
-        text_chunks = simple_chunk_text(
-            repo_text_content,
-            TEXT_CHUNK_SIZE_CHARS,
-            TEXT_CHUNK_OVERLAP_CHARS
-        )
+        # Chunk per file and embed; chunks seen in earlier runs come from the embedding cache
+        embedded_context = await asyncio.to_thread(embed_context_documents, context_documents)
+        text_chunks = embedded_context["chunks"]
+
+        if embedded_context["error"]:
+            err_msg = f"{step_prefix} Failed to generate embeddings for document chunks: {embedded_context['error']}"
+            print(err_msg)
+            yield {"type": "status", "status": "error", "repo": repo_display_name, "message": err_msg}
+            processed_results_for_filtering.append({"repo": repo_display_name, "cv_entry": None, "error": err_msg, "pushed_at": pushed_at})
+            await asyncio.sleep(0.1)
+            continue
 
         if not text_chunks:
             err_msg = f"{step_prefix} No text chunks generated from repository content. Cannot create embeddings."
@@ -82,9 +134,8 @@ async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list
             await asyncio.sleep(0.1)
             continue
         
-        # Add chunks to vector store (this is also synchronous internally)
-        docs_to_add_to_store = [(chunk, repo_display_name) for chunk in text_chunks]
-        added_to_vs_ok = await asyncio.to_thread(vector_store.add_documents, docs_to_add_to_store)
+        # Replace this repo's chunks in the store; other repos' vectors are left in place (synchronous internally)
+        added_to_vs_ok = await asyncio.to_thread(vector_store_registry.upsert_repo, vector_store_namespace, repo_display_name, text_chunks, embedded_context["embeddings"])
 
         if not added_to_vs_ok:
             err_msg = f"{step_prefix} Failed to add document chunks to vector store."
@@ -99,16 +150,15 @@ async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list
 
         yield {"type": "status", "status": "generating_cv", "repo": repo_display_name, "message": f"{step_prefix} Retrieving relevant context and generating CV entry with AI..."}
         
-        # Search relevant chunks (synchronous)
-        # Using repo_display_name as query might be too broad. A more specific query could be better.
-        # For now, this uses the repo name to find its own chunks.
-        query_for_chunks = f"Summary of project {repo_display_name}"
-        relevant_chunks = await asyncio.to_thread(
-            vector_store.search_relevant_chunks,
-            query_for_chunks,
-            repo_display_name,  # Filter by this repo
+        # Retrieve context for every CV section at once: one embedding batch and one search over the facet queries (synchronous)
+        facet_queries = [template.format(repo=repo_display_name) for template in CONTEXT_RETRIEVAL_FACET_QUERIES]
+        retrieved_by_repo = await asyncio.to_thread(
+            vector_store_registry.search_facets,
+            vector_store_namespace,
+            {repo_display_name: facet_queries},  # Filter by this repo
             MAX_CONTEXT_CHUNKS_FOR_GEMINI_CV_GENERATION
         )
+        relevant_chunks = retrieved_by_repo.get(repo_display_name, [])
 
         if not relevant_chunks:
              yield {"type": "status", "status": "warning", "repo": repo_display_name, "message": f"{step_prefix} No specific context chunks found in vector store for CV generation. AI will generate based on project name only."}
@@ -126,6 +176,8 @@ async def orchestrate_cv_generation_for_repos(token: str, repos_to_process: list
             "error": ai_cv_data.get("error")
         }
         processed_results_for_filtering.append(cv_result_dict)
+        if INCREMENTAL_CV_GENERATION and cv_result_dict.get("cv_entry"):
+            await asyncio.to_thread(cv_entry_store.put, repo_display_name, pushed_at, GENERATION_MODEL_NAME, cv_result_dict["cv_entry"])
         
         if cv_result_dict.get("cv_entry"):
             print(f"Successfully generated CV entry for {repo_display_name}.")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local Embedding Backend Throughput/Accuracy Report
+
+Compares the local embedding backends (LOCAL_EMBEDDING_BACKEND / LOCAL_EMBEDDING_ONNX_QUANTIZATION,
+as built by local_embedding_service.load_local_embedding_model) on our own chunk texts:
+encode throughput, and agreement with the PyTorch reference vectors (cosine similarity and
+nearest-neighbour recall@k, i.e. whether retrieval would pick the same chunks).
+
+Texts are chunks of the blob store's cached file texts, or of this repository's own source
+files when the blob store is empty.
+
+Usage:
+  python embedding_backend_benchmark.py
+  python embedding_backend_benchmark.py --texts 2000 --threads 4
+  python embedding_backend_benchmark.py --quantization avx2 avx512_vnni
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from local_embedding_service import load_local_embedding_model
+from utils import simple_chunk_text
+from config import (
+    LOCAL_EMBEDDING_MODEL_NAME, LOCAL_EMBEDDING_BATCH_SIZE, BLOB_STORE_PATH,
+    TEXT_CHUNK_SIZE_CHARS, TEXT_CHUNK_OVERLAP_CHARS,
+)
+
+
+def load_blob_texts(limit: int) -> list[str]:
+    if not os.path.exists(BLOB_STORE_PATH):
+        return []
+    conn = sqlite3.connect(BLOB_STORE_PATH)
+    try:
+        rows = conn.execute("SELECT text FROM blobs ORDER BY last_access DESC LIMIT ?", (limit,)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return [text for (text,) in rows]
+
+
+def load_source_texts() -> list[str]:
+    texts = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(path, encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+
+
+def neighbour_recall(reference: np.ndarray, candidate: np.ndarray, queries: int, k: int) -> float:
+    """Share of each query's top-k reference neighbours (by cosine) that the candidate vectors also rank top-k."""
+    def top_k(vectors):
+        normed = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        scores = normed[:queries] @ normed.T
+        scores[np.arange(queries), np.arange(queries)] = -np.inf # A chunk is not its own neighbour
+        return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    reference_top, candidate_top = top_k(reference), top_k(candidate)
+    return sum(len(set(r) & set(c)) for r, c in zip(reference_top, candidate_top)) / reference_top.size
+
+
+def encode_timed(model, texts: list[str], batch_size: int):
+    model.encode(texts[:batch_size], batch_size=batch_size, show_progress_bar=False) # Warm-up
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput/accuracy report for the local embedding backends.")
+    parser.add_argument("--texts", type=int, default=1000, help="Number of chunks to embed.")
+    parser.add_argument("--threads", type=int, default=None, help="Inference threads (torch and ONNX Runtime).")
+    parser.add_argument("--quantization", nargs="*", default=["avx2", "avx512", "avx512_vnni"],
+                        help="ONNX int8 quantization targets to compare (in addition to fp32).")
+    parser.add_argument("--batch-size", type=int, default=LOCAL_EMBEDDING_BATCH_SIZE)
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query for recall@k.")
+    args = parser.parse_args()
+
+    documents = load_blob_texts(args.texts) or load_source_texts()
+    texts = [chunk for document in documents for chunk in simple_chunk_text(document, TEXT_CHUNK_SIZE_CHARS, TEXT_CHUNK_OVERLAP_CHARS)]
+    texts = [text for text in texts if text.strip()][:args.texts]
+    if len(texts) <= args.k:
+        print(f"Only {len(texts)} chunks found; nothing to benchmark.")
+        sys.exit(1)
+    queries = min(200, len(texts))
+    k = min(args.k, len(texts) - 1)
+
+    print(f"Model: {LOCAL_EMBEDDING_MODEL_NAME}, {len(texts)} chunks, batch size {args.batch_size}, threads {args.threads or 'default'}\n")
+    print(f"{'backend':<28} {'load (s)':>8} {'texts/s':>9} {'speedup':>8} {'mean cos':>9} {'min cos':>8} {'recall@k':>9}")
+
+    variants = [("torch", None), ("onnx", None)] + [("onnx", quantization) for quantization in args.quantization]
+    reference, reference_seconds = None, None
+    for backend, quantization in variants:
+        label = backend + (f" int8 ({quantization})" if quantization else "")
+        started = time.perf_counter()
+        try:
+            model = load_local_embedding_model(LOCAL_EMBEDDING_MODEL_NAME, backend, quantization, args.threads)
+        except Exception as e:
+            print(f"{label:<28} unavailable: {e}")
+            continue
+        load_seconds = time.perf_counter() - started
+        vectors, seconds = encode_timed(model, texts, args.batch_size)
+        if reference is None:
+            if backend != "torch":
+                print("(PyTorch backend unavailable; accuracy is relative to the first backend that loaded)")
+            reference, reference_seconds = vectors, seconds
+        cosines = cosine_rows(reference, vectors)
+        print(f"{label:<28} {load_seconds:>8.1f} {len(texts) / seconds:>9.1f} {reference_seconds / seconds:>7.2f}x "
+              f"{cosines.mean():>9.5f} {cosines.min():>8.5f} {neighbour_recall(reference, vectors, queries, k):>9.3f}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
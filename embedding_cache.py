@@ -0,0 +1,163 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_VECTOR_DTYPE,
+)
+
+TOUCH_RESOLUTION_SECONDS = 300 # A hit re-stamps last_access only if the stored stamp is older than this
+
+
+def text_hash(text: str) -> bytes:
+    """16-byte content digest of a text (the cache never stores the text itself)."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed (SQLite) cache of embeddings keyed by (hash of the text, embedding model name).
+    Vectors are stored as raw float32 (or float16) bytes. Bounded by total vector bytes and entry count;
+    least recently used entries are evicted first. Hit/miss counts are kept for the process lifetime.
+    """
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES, vector_dtype: str = EMBEDDING_CACHE_VECTOR_DTYPE):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.vector_dtype = np.dtype(vector_dtype)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = None
+        self._total_entries = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    text_hash BLOB NOT NULL,
+                    model TEXT NOT NULL,
+                    dtype TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (text_hash, model)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+            self._conn.commit()
+            self._total_bytes, self._total_entries = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings"
+            ).fetchone()
+        return self._conn
+
+    def get_many(self, texts: list[str], model_name: str) -> list:
+        """Returns one float32 vector (or None on a miss) per text, in order."""
+        hashes = [text_hash(text) for text in texts]
+        found, stale = {}, []
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            unique_hashes = list(dict.fromkeys(hashes))
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for digest, dtype, vector, last_access in conn.execute(
+                    f"SELECT text_hash, dtype, vector, last_access FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (model_name, *batch),
+                ):
+                    found[digest] = np.frombuffer(vector, dtype=dtype).astype(np.float32)
+                    if now - last_access >= TOUCH_RESOLUTION_SECONDS:
+                        stale.append((now, digest, model_name))
+            if stale:
+                conn.executemany("UPDATE embeddings SET last_access = ? WHERE text_hash = ? AND model = ?", stale)
+                conn.commit()
+            results = [found.get(digest) for digest in hashes]
+            hits = sum(1 for vector in results if vector is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: list[str], model_name: str, vectors):
+        vectors_np = np.asarray(vectors, dtype=np.float32)
+        if vectors_np.ndim != 2 or len(vectors_np) != len(texts) or not len(texts):
+            return
+        encoded = vectors_np.astype(self.vector_dtype)
+        rows = {text_hash(text): encoded[i].tobytes() for i, text in enumerate(texts)}
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            digests = list(rows)
+            # Rows being replaced must not be counted twice
+            for start in range(0, len(digests), 500):
+                batch = digests[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                existing_bytes, existing_entries = conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (model_name, *batch),
+                ).fetchone()
+                self._total_bytes -= existing_bytes
+                self._total_entries -= existing_entries
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (text_hash, model, dtype, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                [(digest, model_name, self.vector_dtype.name, vector, now) for digest, vector in rows.items()],
+            )
+            self._total_bytes += sum(len(vector) for vector in rows.values())
+            self._total_entries += len(rows)
+            self._evict_locked(conn)
+            conn.commit()
+
+    def _evict_locked(self, conn: sqlite3.Connection):
+        if self._total_bytes <= self.max_bytes and self._total_entries <= self.max_entries:
+            return
+        freed_bytes, removed = 0, 0
+        victims = []
+        for digest, model_name, size in conn.execute(
+            "SELECT text_hash, model, LENGTH(vector) FROM embeddings ORDER BY last_access ASC"
+        ):
+            if self._total_bytes - freed_bytes <= self.max_bytes and self._total_entries - removed <= self.max_entries:
+                break
+            victims.append((digest, model_name))
+            freed_bytes += size
+            removed += 1
+        conn.executemany("DELETE FROM embeddings WHERE text_hash = ? AND model = ?", victims)
+        self._total_bytes -= freed_bytes
+        self._total_entries -= removed
+        print(f"Embedding cache: evicted {removed} entries ({freed_bytes} bytes).")
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._get_conn()
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._total_entries,
+                "vector_bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
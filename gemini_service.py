@@ -1,15 +1,22 @@
 import time
 import google.generativeai as genai
 import asyncio # Import asyncio for async sleep
+from concurrent.futures import ThreadPoolExecutor
 
 from config import (
     GOOGLE_API_KEY, 
     GENERATION_MODEL_NAME, 
     GEMINI_API_GENERATION_DELAY_SECONDS,
     USE_LOCAL_EMBEDDINGS, 
-    GEMINI_EMBEDDING_MODEL_NAME 
+    GEMINI_EMBEDDING_MODEL_NAME,
+    LOCAL_EMBEDDING_MODEL_NAME,
+    GEMINI_EMBEDDING_BATCH_SIZE,
+    GEMINI_EMBEDDING_MAX_CONCURRENCY,
+    GEMINI_EMBEDDING_MAX_RETRIES,
+    GEMINI_EMBEDDING_RETRY_BACKOFF_SECONDS,
 )
-from local_embedding_service import generate_single_local_embedding, generate_local_embeddings_batch
+from local_embedding_service import generate_single_local_embedding, generate_local_embeddings_batch, local_embedding_variant
+from embedding_cache import embedding_cache
 
 
 gemini_generation_configured = False
@@ -26,6 +33,15 @@ else:
     print("GOOGLE_API_KEY not found. Gemini features will be disabled.")
 
 
+def get_active_embedding_model_name():
+    """Name of the model that get_embeddings_batch currently routes to (used to key cached embeddings)."""
+    if not USE_LOCAL_EMBEDDINGS:
+        return GEMINI_EMBEDDING_MODEL_NAME
+    # Quantized backends produce slightly different vectors, so they get their own cache entries
+    variant = local_embedding_variant()
+    return f"{LOCAL_EMBEDDING_MODEL_NAME}+{variant}" if variant else LOCAL_EMBEDDING_MODEL_NAME
+
+
 def get_embedding(text_content: str):
     """Wrapper function to get embedding, using local or Gemini API based on config."""
     if USE_LOCAL_EMBEDDINGS:
@@ -53,31 +69,100 @@ def get_embedding(text_content: str):
             return {"error": str(e), "embedding": None}
 
 def get_embeddings_batch(texts: list[str]):
-    """Wrapper function to get embeddings for a batch, using local or Gemini API."""
+    """
+    Wrapper function to get embeddings for a batch, using local or Gemini API.
+    Texts already embedded by the active model come from the embedding cache; only the misses
+    (each distinct text once) are sent to the model, and their vectors are cached.
+    "embeddings" is aligned with `texts`. With the Gemini API some items can fail on their own: they are
+    None in the list and "error" describes them, while the other vectors are still returned.
+    """
+    if embedding_cache is None or not texts:
+        return _compute_embeddings_batch(texts)
+    model_name = get_active_embedding_model_name()
+    cached = embedding_cache.get_many(texts, model_name)
+    miss_texts = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+    print(f"Embedding cache: {len(texts) - sum(1 for vector in cached if vector is None)}/{len(texts)} hits, {len(miss_texts)} texts to embed.")
+    if miss_texts:
+        embedding_results = _compute_embeddings_batch(miss_texts)
+        if not embedding_results.get("embeddings") or len(embedding_results["embeddings"]) != len(miss_texts):
+            return {"error": embedding_results["error"] or "Embedding count mismatch.", "embeddings": None}
+        computed = dict(zip(miss_texts, embedding_results["embeddings"]))
+        succeeded = [text for text in miss_texts if computed[text] is not None]
+        if succeeded:
+            embedding_cache.put_many(succeeded, model_name, [computed[text] for text in succeeded])
+        error = embedding_results["error"]
+    else:
+        computed, error = {}, None
+    return {
+        "error": error,
+        "embeddings": [vector.tolist() if vector is not None else computed[text] for text, vector in zip(texts, cached)],
+    }
+
+
+def _compute_embeddings_batch(texts: list[str]):
     if USE_LOCAL_EMBEDDINGS:
         return generate_local_embeddings_batch(texts)
-    else:
-        # Simplified batching with Gemini API (sequential sync calls)
-        embeddings_list = []
-        errors_list = []
-        for text_idx, text in enumerate(texts):
-            # Consider adding a small delay here if making many sequential API calls for embeddings
-            # if text_idx > 0: time.sleep(1) # Example: 1 sec delay between embedding calls
-            result = get_embedding(text) 
-            if result["error"]:
-                errors_list.append(f"Text {text_idx+1}: {result['error']}")
-                # Optionally, append a None or a zero vector if you need to maintain list length
-                # embeddings_list.append(None) 
-            elif result["embedding"]:
-                embeddings_list.append(result["embedding"])
-            else: # Should not happen if error/embedding is always present
-                errors_list.append(f"Text {text_idx+1}: Unknown error during embedding.")
-        
-        if errors_list:
-            # If some embeddings failed but others succeeded, return partial results
-            # The caller (vector_store_service) needs to handle this (e.g. skip docs that failed embedding)
-            return {"error": f"Some errors occurred during Gemini API batch embedding: {'; '.join(errors_list)}", "embeddings": embeddings_list or None}
-        return {"error": None, "embeddings": embeddings_list}
+    return _gemini_embeddings_batch(texts)
+
+
+def _embed_gemini_request(batch_texts: list[str]):
+    """One batch embedding request; returns one vector per text or raises."""
+    result = genai.embed_content(
+        model=GEMINI_EMBEDDING_MODEL_NAME,
+        content=batch_texts,
+        task_type="RETRIEVAL_DOCUMENT"
+    )
+    vectors = result['embedding']
+    if len(vectors) != len(batch_texts):
+        raise ValueError(f"Expected {len(batch_texts)} embeddings, got {len(vectors)}.")
+    return vectors
+
+
+def _gemini_embeddings_batch(texts: list[str]):
+    """
+    Embeds texts with multi-text Gemini requests (GEMINI_EMBEDDING_BATCH_SIZE per request,
+    up to GEMINI_EMBEDDING_MAX_CONCURRENCY in flight). Results keep their positions: items of a failed
+    request are retried with backoff in batches a quarter the size (isolating items that keep failing), and those that never succeed are left as None.
+    """
+    if not gemini_generation_configured:
+        return {"error": "Gemini SDK not available or configured for API embeddings.", "embeddings": None}
+    embeddings_list = [None] * len(texts)
+    item_errors = {i: "Cannot generate embedding for empty text." for i, text in enumerate(texts) if not text or not text.strip()}
+    pending = [i for i in range(len(texts)) if i not in item_errors]
+    requests_made = 0
+    for attempt in range(GEMINI_EMBEDDING_MAX_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            delay = GEMINI_EMBEDDING_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"Retrying {len(pending)} failed Gemini embeddings in {delay}s (attempt {attempt + 1})...")
+            time.sleep(delay)
+        batch_size = max(1, GEMINI_EMBEDDING_BATCH_SIZE >> (2 * attempt))
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        print(f"Generating {len(pending)} embeddings via Gemini API in {len(batches)} request(s)...")
+        with ThreadPoolExecutor(max_workers=min(GEMINI_EMBEDDING_MAX_CONCURRENCY, len(batches))) as executor:
+            futures = [executor.submit(_embed_gemini_request, [texts[i] for i in batch]) for batch in batches]
+            failed = []
+            for batch, future in zip(batches, futures):
+                try:
+                    for i, vector in zip(batch, future.result()):
+                        embeddings_list[i] = vector
+                        item_errors.pop(i, None)
+                except Exception as e:
+                    print(f"Error generating Gemini API embeddings for a batch of {len(batch)}: {e}")
+                    for i in batch:
+                        item_errors[i] = str(e)
+                    failed.extend(batch)
+        requests_made += len(batches)
+        pending = sorted(failed)
+
+    print(f"Gemini embeddings: {len(texts) - len(item_errors)}/{len(texts)} succeeded in {requests_made} request(s).")
+    if item_errors:
+        # Successful vectors are kept at their positions; the caller skips the None entries
+        errors_summary = '; '.join(f"Text {i+1}: {error}" for i, error in sorted(item_errors.items())[:5])
+        more = f" (and {len(item_errors) - 5} more)" if len(item_errors) > 5 else ""
+        return {"error": f"{len(item_errors)} of {len(texts)} Gemini API embeddings failed: {errors_summary}{more}", "embeddings": embeddings_list}
+    return {"error": None, "embeddings": embeddings_list}
 
 
 def generate_text_from_prompt(prompt: str, safety_settings=None):
@@ -0,0 +1,155 @@
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import (
+    GITHUB_HTTP2_ENABLED,
+    GITHUB_HTTP_MAX_CONNECTIONS,
+    GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    GITHUB_PER_HOST_CONCURRENCY,
+    GITHUB_DEFAULT_HOST_CONCURRENCY,
+    GITHUB_RESPONSE_CACHE_ENABLED,
+)
+from github_response_cache import GitHubResponseCache, token_identity
+from github_rate_limiter import GitHubRateLimiter
+
+# HTTP/2 needs the optional 'h2' package (installed by httpx[http2])
+try:
+    import h2 # noqa: F401
+    http2_available = True
+except ImportError:
+    http2_available = False
+    if GITHUB_HTTP2_ENABLED:
+        print("'h2' package not found. GitHub client will use HTTP/1.1 keep-alive connections.")
+
+
+class GitHubClient:
+    """
+    Shared async HTTP client for all GitHub traffic.
+    Connections are pooled and kept alive across requests, and each host gets its own concurrency limit.
+    """
+
+    def __init__(self, per_host_concurrency: dict = None, default_host_concurrency: int = GITHUB_DEFAULT_HOST_CONCURRENCY, response_cache: GitHubResponseCache = None):
+        self.per_host_concurrency = dict(GITHUB_PER_HOST_CONCURRENCY if per_host_concurrency is None else per_host_concurrency)
+        self.default_host_concurrency = default_host_concurrency
+        self.response_cache = response_cache
+        self.rate_limiter = GitHubRateLimiter()
+        self._client = None
+        self._host_semaphores = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop (uvicorn's), not the import-time one.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=GITHUB_HTTP2_ENABLED and http2_available,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=GITHUB_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=GITHUB_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=GITHUB_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+            )
+        return self._client
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_concurrency.get(host, self.default_host_concurrency))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    @staticmethod
+    def _token_id(headers: dict) -> str:
+        # "Authorization: token <PAT>" -> identity of the PAT itself
+        return token_identity((headers or {}).get("Authorization", "").split(" ")[-1])
+
+    def get_rate_limit_budget(self, token: str) -> dict:
+        """Remaining quota and expected queueing delay for a token (see GitHubRateLimiter.get_budget)."""
+        return self.rate_limiter.get_budget(token_identity(token))
+
+    async def _send_scheduled(self, url: str, headers: dict, timeout: float, stream: bool = False) -> httpx.Response:
+        """
+        Sends a GET through the rate-limit scheduler, retrying (queued, not failed) while GitHub rate limits it.
+        Streamed requests hold their host slot for the whole body read, so the caller takes it instead.
+        """
+        token_id = self._token_id(headers)
+        client = self._get_client()
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(token_id)
+            async with (nullcontext() if stream else self._get_host_semaphore(url)):
+                request = client.build_request("GET", url, headers=headers, timeout=timeout)
+                response = await client.send(request, stream=stream)
+                body_text = ""
+                if response.status_code in (403, 429):
+                    await response.aread()
+                    body_text = response.text
+            retry_delay = self.rate_limiter.record_response(token_id, response.status_code, response.headers, body_text, attempt)
+            if retry_delay is None:
+                return response
+            await response.aclose()
+            attempt += 1
+            await asyncio.sleep(retry_delay)
+
+    async def get(self, url: str, headers: dict = None, timeout: float = 15, conditional: bool = False) -> httpx.Response:
+        """
+        Performs a GET over the shared pool, waiting for the rate-limit scheduler and a free slot on the target host.
+        With `conditional=True` the request is revalidated against the response cache (If-None-Match /
+        If-Modified-Since); a 304 is turned back into the cached 200 response, so callers see no difference.
+        """
+        headers = dict(headers or {})
+        cache_key, cached = None, None
+        if conditional and self.response_cache is not None:
+            cache_key = self.response_cache.make_key(headers.get("Authorization", ""), url, headers.get("Accept", ""))
+            # SQLite calls run in a worker thread so they never stall the event loop
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached:
+                if cached["etag"]:
+                    headers["If-None-Match"] = cached["etag"]
+                if cached["last_modified"]:
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self._send_scheduled(url, headers, timeout)
+
+        if cache_key is None:
+            return response
+        if response.status_code == 304 and cached:
+            print(f"Not modified (304), served from cache: {url[:100]}")
+            await asyncio.to_thread(self.response_cache.touch, cache_key)
+            return httpx.Response(200, headers=cached["headers"], content=cached["body"], request=response.request)
+        if response.status_code == 200:
+            await asyncio.to_thread(
+                self.response_cache.put,
+                cache_key,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                {k: v for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")},
+                response.content,
+            )
+        return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: dict = None, timeout: float = 60):
+        """Streams a GET response body (e.g. a repository archive) without buffering it in memory."""
+        async with self._get_host_semaphore(url):
+            response = await self._send_scheduled(url, dict(headers or {}), timeout, stream=True)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    async def aclose(self):
+        """Closes the pooled connections. Called on application shutdown."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._host_semaphores = {}
+        if self.response_cache is not None:
+            await asyncio.to_thread(self.response_cache.close)
+
+
+github_client = GitHubClient(response_cache=GitHubResponseCache() if GITHUB_RESPONSE_CACHE_ENABLED else None)
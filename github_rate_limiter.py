@@ -0,0 +1,113 @@
+import asyncio
+import random
+import time
+
+from config import (
+    GITHUB_RATE_LIMIT_RESERVE,
+    GITHUB_RATE_LIMIT_PACING_THRESHOLD,
+    GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS,
+    GITHUB_RATE_LIMIT_MAX_RETRIES,
+    GITHUB_RATE_LIMIT_BACKOFF_BASE_SECONDS,
+    GITHUB_RATE_LIMIT_BACKOFF_MAX_SECONDS,
+)
+
+
+class _TokenBudget:
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0 # Set by Retry-After / exhausted quota / secondary-limit backoff
+        self.next_slot = 0.0 # Pacing: earliest start time for the next call
+
+
+class GitHubRateLimiter:
+    """
+    Tracks each token's GitHub quota from response headers and schedules calls to fit it.
+    Calls are delayed (queued) rather than failed: they are spread evenly when the budget runs low,
+    held until the reset when it is exhausted, and retried with jittered exponential backoff on
+    secondary rate limits.
+    """
+
+    def __init__(self):
+        self._budgets = {}
+
+    def _budget(self, token_id: str) -> _TokenBudget:
+        budget = self._budgets.get(token_id)
+        if budget is None:
+            budget = self._budgets[token_id] = _TokenBudget()
+        return budget
+
+    def _expected_wait(self, budget: _TokenBudget, now: float) -> float:
+        if budget.blocked_until > now:
+            return budget.blocked_until - now
+        if budget.remaining is not None and budget.reset_at > now:
+            if budget.remaining <= GITHUB_RATE_LIMIT_RESERVE:
+                return budget.reset_at - now
+            if budget.remaining < GITHUB_RATE_LIMIT_PACING_THRESHOLD:
+                return max(0.0, budget.next_slot - now)
+        return 0.0
+
+    async def acquire(self, token_id: str):
+        """Waits until the token may make its next call, and reserves that call from the budget."""
+        budget = self._budget(token_id)
+        now = time.time()
+        wait = self._expected_wait(budget, now)
+        if (budget.blocked_until <= now and budget.remaining is not None and budget.reset_at > now
+                and GITHUB_RATE_LIMIT_RESERVE < budget.remaining < GITHUB_RATE_LIMIT_PACING_THRESHOLD):
+            interval = (budget.reset_at - now) / budget.remaining
+            budget.next_slot = max(now, budget.next_slot) + interval
+        if budget.remaining:
+            budget.remaining -= 1 # Optimistic; corrected by the next response's headers
+        wait = min(wait, GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS)
+        if wait > 0:
+            print(f"GitHub rate limit scheduler: delaying call by {wait:.1f}s (remaining={budget.remaining}).")
+            await asyncio.sleep(wait)
+
+    def record_response(self, token_id: str, status_code: int, headers, body_text: str = "", attempt: int = 0):
+        """
+        Updates the token's budget from a response.
+        Returns the delay in seconds before retrying if the response was rate limited, else None.
+        """
+        budget = self._budget(token_id)
+        now = time.time()
+        if headers.get("X-RateLimit-Remaining") is not None:
+            try:
+                budget.remaining = int(headers["X-RateLimit-Remaining"])
+                budget.limit = int(headers.get("X-RateLimit-Limit", budget.limit or 0)) or budget.limit
+                budget.reset_at = float(headers.get("X-RateLimit-Reset", budget.reset_at))
+            except ValueError:
+                pass
+
+        if status_code not in (403, 429):
+            return None
+        retry_after = headers.get("Retry-After")
+        quota_exhausted = headers.get("X-RateLimit-Remaining") == "0"
+        if not (status_code == 429 or retry_after or quota_exhausted or "rate limit" in (body_text or "").lower()):
+            return None # A permissions 403, not a rate limit
+        if attempt >= GITHUB_RATE_LIMIT_MAX_RETRIES:
+            return None
+
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        elif quota_exhausted and budget.reset_at > now:
+            delay = budget.reset_at - now + 1
+        else:
+            # Secondary rate limit without guidance: exponential backoff with jitter
+            delay = min(GITHUB_RATE_LIMIT_BACKOFF_MAX_SECONDS, GITHUB_RATE_LIMIT_BACKOFF_BASE_SECONDS * (2 ** attempt))
+            delay *= 0.5 + random.random()
+        delay = min(delay, GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS)
+        budget.blocked_until = max(budget.blocked_until, now + delay) # Queue the token's other calls too
+        print(f"GitHub rate limited (HTTP {status_code}, attempt {attempt + 1}). Retrying in {delay:.1f}s.")
+        return delay
+
+    def get_budget(self, token_id: str):
+        """Current view of a token's budget, including how long a new call would be queued."""
+        budget = self._budget(token_id)
+        now = time.time()
+        return {
+            "limit": budget.limit,
+            "remaining": budget.remaining,
+            "reset_in_seconds": max(0, round(budget.reset_at - now)) if budget.reset_at else None,
+            "expected_wait_seconds": round(min(self._expected_wait(budget, now), GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS), 1),
+        }
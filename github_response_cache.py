@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import (
+    GITHUB_RESPONSE_CACHE_PATH,
+    GITHUB_RESPONSE_CACHE_MAX_BYTES,
+    GITHUB_RESPONSE_CACHE_MAX_ENTRIES,
+)
+
+# LRU order only needs to be approximate: a hit re-stamps last_access only if the stored stamp is older than this,
+# and stamps are queued in memory and written in one batch (before eviction, or once enough are pending)
+TOUCH_RESOLUTION_SECONDS = 300
+MAX_PENDING_TOUCHES = 256
+
+
+def token_identity(token: str) -> str:
+    """Returns a stable, non-reversible identifier for a token (raw tokens are never written to disk)."""
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:32]
+
+
+class GitHubResponseCache:
+    """
+    Disk-backed (SQLite) cache of GitHub GET responses with their validators (ETag / Last-Modified).
+    Bounded by total body bytes and entry count; least recently used entries are evicted first.
+    Methods block on SQLite; async callers run them in a worker thread.
+    """
+
+    def __init__(self, db_path: str = GITHUB_RESPONSE_CACHE_PATH, max_bytes: int = GITHUB_RESPONSE_CACHE_MAX_BYTES, max_entries: int = GITHUB_RESPONSE_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pending_touches = {} # cache_key -> last_access not yet written
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(token: str, url: str, accept: str = "") -> str:
+        return f"{token_identity(token)}|{accept}|{url}"
+
+    def get(self, cache_key: str):
+        """Returns {"etag", "last_modified", "headers", "body"} for a cached response, or None."""
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                "SELECT etag, last_modified, headers, body, last_access FROM responses WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch_locked(conn, cache_key, row[4])
+        return {"etag": row[0], "last_modified": row[1], "headers": json.loads(row[2]), "body": row[3]}
+
+    def touch(self, cache_key: str):
+        """Marks an entry as recently used (e.g. after a 304 revalidation)."""
+        with self._lock:
+            self._touch_locked(self._get_conn(), cache_key, None)
+
+    def _touch_locked(self, conn: sqlite3.Connection, cache_key: str, stored_last_access):
+        now = time.time()
+        last_access = self._pending_touches.get(cache_key, stored_last_access)
+        if last_access is not None and now - last_access < TOUCH_RESOLUTION_SECONDS:
+            return
+        self._pending_touches[cache_key] = now
+        if len(self._pending_touches) >= MAX_PENDING_TOUCHES:
+            self._flush_touches_locked(conn)
+            conn.commit()
+
+    def _flush_touches_locked(self, conn: sqlite3.Connection):
+        if self._pending_touches:
+            conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE cache_key = ?",
+                [(last_access, cache_key) for cache_key, last_access in self._pending_touches.items()],
+            )
+            self._pending_touches = {}
+
+    def put(self, cache_key: str, etag: str, last_modified: str, headers: dict, body: bytes):
+        if not etag and not last_modified:
+            return # Nothing to revalidate with, so not worth storing
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, etag, last_modified, headers, body, size, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, etag, last_modified, json.dumps(headers), body, len(body), time.time()),
+            )
+            self._pending_touches.pop(cache_key, None)
+            self._flush_touches_locked(conn)
+            self._evict_locked(conn)
+            conn.commit()
+
+    def _evict_locked(self, conn: sqlite3.Connection):
+        total_bytes, total_entries = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+        if total_bytes <= self.max_bytes and total_entries <= self.max_entries:
+            return
+        freed_bytes, removed = 0, 0
+        victims = []
+        for cache_key, size in conn.execute("SELECT cache_key, size FROM responses ORDER BY last_access ASC"):
+            if total_bytes - freed_bytes <= self.max_bytes and total_entries - removed <= self.max_entries:
+                break
+            victims.append((cache_key,))
+            freed_bytes += size
+            removed += 1
+        conn.executemany("DELETE FROM responses WHERE cache_key = ?", victims)
+        print(f"GitHub response cache: evicted {removed} entries ({freed_bytes} bytes).")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._flush_touches_locked(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
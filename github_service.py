@@ -1,67 +1,90 @@
-import requests
-from urllib.parse import quote
+import asyncio
+import httpx
+from urllib.parse import quote, parse_qs, urlsplit
 import base64
-import time
 import os # For path operations
+import zlib
 
-from config import GITHUB_API_BASE_URL, MAX_FILE_SIZE_FOR_CONTEXT_BYTES, MAX_CONSOLIDATED_TEXT_LENGTH_CHARS
+from config import (
+    GITHUB_API_BASE_URL, MAX_FILE_SIZE_FOR_CONTEXT_BYTES, MAX_CONSOLIDATED_TEXT_LENGTH_CHARS,
+    GITHUB_CONTEXT_INGESTION_MODE, GITHUB_REPO_LIST_PAGE_CONCURRENCY, GITHUB_ARCHIVE_INGESTION_MIN_FILES, GITHUB_ARCHIVE_INGESTION_MAX_REPO_BYTES,
+)
 from utils import format_github_api_error
+from github_client import github_client
+from archive_stream import TarGzStreamReader
+from blob_store import blob_store
+from context_file_selector import select_context_files
+
+GITHUB_JSON_MEDIA_TYPE = "application/vnd.github.v3+json"
+GITHUB_RAW_MEDIA_TYPE = "application/vnd.github.raw"
+GITHUB_SHA_MEDIA_TYPE = "application/vnd.github.sha"
 
 # --- GitHub API Helper Functions ---
 
-def get_github_api_headers(token: str):
+def get_github_api_headers(token: str, accept: str = GITHUB_JSON_MEDIA_TYPE):
     """Returns headers for GitHub API requests."""
     return {
         "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json",
+        "Accept": accept,
         "X-GitHub-Api-Version": "2022-11-28" # Good practice to specify version
     }
 
-def fetch_user_repos(token: str):
-    """Fetches all repositories for the authenticated user."""
-    repos = []
+async def fetch_user_repos(token: str):
+    """
+    Fetches all repositories for the authenticated user.
+    The first page tells us (via the Link header) how many pages exist; the rest are fetched concurrently.
+    """
     headers = get_github_api_headers(token)
-    # Get all repos user has access to, sorted by last push, 100 per page
-    url = f"{GITHUB_API_BASE_URL}/user/repos?type=all&sort=pushed&direction=desc&per_page=30" # Max 100, but 30 is fine for testing
-    
-    page = 1
-    while url:
+    # Get all repos user has access to, sorted by last push, 100 per page (GitHub's max)
+    base_url = f"{GITHUB_API_BASE_URL}/user/repos?type=all&sort=pushed&direction=desc&per_page=100"
+
+    async def fetch_page(page: int):
+        url = f"{base_url}&page={page}"
         print(f"Fetching GitHub repos page {page} from {url}...")
-        try:
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            current_page_repos = response.json()
-            if not current_page_repos:
-                break
-            repos.extend(current_page_repos)
-            
-            # Limit pages fetched for prototype to avoid excessive API calls if user has many repos
-            if page >= 2: # Fetch up to 2 pages (e.g. 60 repos if per_page=30)
-                print("Reached prototype page limit for fetching repositories.")
-                break
-
-            if 'next' in response.links:
-                url = response.links['next']['url']
-                page += 1
-            else:
-                url = None
-        except requests.exceptions.HTTPError as e:
-            return {"error": format_github_api_error(e), "data": []}
-        except requests.exceptions.RequestException as e:
-            return {"error": f"Request failed: {e}", "data": []}
-        time.sleep(0.3) # Small delay to be nice to GitHub API
-            
-    return {"error": None, "data": repos}
+        response = await github_client.get(url, headers=headers, timeout=15, conditional=True)
+        response.raise_for_status()
+        return response
 
+    try:
+        first_response = await fetch_page(1)
+        repos = list(first_response.json())
+        last_page = 1
+        if 'last' in first_response.links:
+            last_page_values = parse_qs(urlsplit(first_response.links['last']['url']).query).get("page")
+            if last_page_values and last_page_values[0].isdigit():
+                last_page = int(last_page_values[0])
+
+        if last_page > 1:
+            page_semaphore = asyncio.Semaphore(GITHUB_REPO_LIST_PAGE_CONCURRENCY)
+
+            async def fetch_page_bounded(page: int):
+                async with page_semaphore:
+                    return (await fetch_page(page)).json()
 
-def fetch_repo_contents_list(token: str, owner: str, repo_name: str, path: str = ""):
+            print(f"Fetching {last_page - 1} more repo pages concurrently...")
+            for page_repos in await asyncio.gather(*(fetch_page_bounded(page) for page in range(2, last_page + 1))):
+                repos.extend(page_repos)
+    except httpx.HTTPStatusError as e:
+        return {"error": format_github_api_error(e), "data": []}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {e}", "data": []}
+
+    # Pages can shift while being fetched concurrently; de-duplicate and restore pushed_at order
+    unique_repos = {repo.get("id", repo.get("full_name")): repo for repo in repos}
+    merged_repos = sorted(unique_repos.values(), key=lambda x: x.get("pushed_at") or "1970-01-01T00:00:00Z", reverse=True)
+    return {"error": None, "data": merged_repos}
+
+
+async def fetch_repo_contents_list(token: str, owner: str, repo_name: str, path: str = "", ref: str = None):
     """Fetches the list of contents (files/directories) for a given path in a repository."""
     headers = get_github_api_headers(token)
     encoded_path = quote(path)
     url = f"{GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/contents/{encoded_path}"
+    if ref:
+        url += f"?ref={quote(ref)}"
     print(f"Fetching content list for {owner}/{repo_name} at path '{path}' from {url}")
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = await github_client.get(url, headers=headers, timeout=10, conditional=True)
         response.raise_for_status()
         contents = response.json()
         # If the path points directly to a file, the API returns a single object, not a list.
@@ -75,27 +98,69 @@ def fetch_repo_contents_list(token: str, owner: str, repo_name: str, path: str =
         # Sort: directories first, then files, all alphabetically
         contents.sort(key=lambda x: (x['type'] != 'dir', x['name'].lower()))
         return {"error": None, "data": contents}
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 404 and "This repository is empty." in e.response.text:
             print(f"Repository {owner}/{repo_name} at path '{path}' is empty or path not found (404).")
             return {"error": None, "data": []} # Treat as empty directory
         return {"error": format_github_api_error(e), "data": []}
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {"error": f"Request failed: {e}", "data": []}
 
 
-def fetch_raw_file_content_from_url(token: str, download_url: str):
-    """Fetches raw content of a file given its download_url."""
+async def fetch_repo_head_sha(token: str, owner: str, repo_name: str):
+    """Resolves the default branch's head commit SHA (a tiny, ETag-cached request)."""
+    headers = get_github_api_headers(token, accept=GITHUB_SHA_MEDIA_TYPE)
+    url = f"{GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/commits/HEAD"
+    try:
+        response = await github_client.get(url, headers=headers, timeout=10, conditional=True)
+        response.raise_for_status()
+        return {"error": None, "data": response.text.strip()}
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 409: # 'Git Repository is empty.'
+            return {"error": None, "data": None}
+        return {"error": format_github_api_error(e), "data": None}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {e}", "data": None}
+
+
+async def fetch_file_content(token: str, owner: str, repo_name: str, path: str, ref: str = None):
+    """
+    Fetches a single file's content in one request (Contents API with the raw media type), at `ref` if given.
+    'not_a_file' is set when the path is a directory or other non-file entry.
+    """
+    headers = get_github_api_headers(token, accept=GITHUB_RAW_MEDIA_TYPE)
+    url = f"{GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/contents/{quote(path)}"
+    if ref:
+        url += f"?ref={quote(ref)}"
+    print(f"Fetching raw file content for {owner}/{repo_name} at path '{path}'")
+    try:
+        response = await github_client.get(url, headers=headers, timeout=15, conditional=True)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        return {"error": format_github_api_error(e), "data": None, "is_binary": False, "not_a_file": False}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {e}", "data": None, "is_binary": False, "not_a_file": False}
+    # Directories (and submodules/symlink listings) still come back as JSON metadata
+    if "vnd.github.raw" not in response.headers.get("Content-Type", "") and response.headers.get("Content-Type", "").startswith("application/json"):
+        return {"error": None, "data": None, "is_binary": False, "not_a_file": True}
+    try:
+        return {"error": None, "data": response.content.decode('utf-8'), "is_binary": False, "not_a_file": False}
+    except UnicodeDecodeError:
+        return {"error": None, "data": None, "is_binary": True, "not_a_file": False}
+
+
+async def fetch_raw_file_content_from_url(token: str, download_url: str, accept: str = GITHUB_JSON_MEDIA_TYPE):
+    """Fetches raw content of a file given its download_url (or an API URL when `accept` is the raw media type)."""
     if not download_url:
         return {"error": "No download URL provided.", "data": None, "is_binary": False}
     
-    headers = get_github_api_headers(token)
+    headers = get_github_api_headers(token, accept=accept)
     # For raw content, sometimes GitHub prefers no specific "Accept" or a generic one.
     # The default from get_github_api_headers should usually be fine.
 
     print(f"Fetching raw file content from: {download_url[:100]}...") # Log truncated URL
     try:
-        response = requests.get(download_url, headers=headers, timeout=15)
+        response = await github_client.get(download_url, headers=headers, timeout=15)
         response.raise_for_status()
         
         # Try to decode as UTF-8, fall back if it fails (binary content)
@@ -106,114 +171,202 @@ def fetch_raw_file_content_from_url(token: str, download_url: str):
             print(f"File at {download_url[:50]}... appears to be binary or not UTF-8.")
             # For CV context, we mostly care about text. If it's binary, we might skip it.
             return {"error": "File is binary or not UTF-8 decodable.", "data": None, "is_binary": True}
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         return {"error": format_github_api_error(e), "data": None, "is_binary": False}
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {"error": f"Request failed for {download_url[:50]}...: {e}", "data": None, "is_binary": False}
 
 
-def get_consolidated_repo_text_for_context(token: str, owner: str, repo_name: str, max_files_to_check=20):
+async def fetch_repo_tree(token: str, owner: str, repo_name: str, tree_ref: str = "HEAD"):
     """
-    Fetches content from prioritized files in the repo root and a few other strategic locations,
-    consolidates them into a single string, respecting MAX_CONSOLIDATED_TEXT_LENGTH_CHARS.
+    Fetches the full file list of a repository in a single recursive Git Trees request.
+    Each entry carries 'path', 'type' ('blob' or 'tree'), 'size' (blobs only), 'sha' and 'url'.
     """
-    print(f"Consolidating text for context in {owner}/{repo_name}")
-    consolidated_text = ""
+    headers = get_github_api_headers(token)
+    url = f"{GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/git/trees/{quote(tree_ref)}?recursive=1"
+    print(f"Fetching recursive tree for {owner}/{repo_name} at '{tree_ref}' from {url}")
+    try:
+        response = await github_client.get(url, headers=headers, timeout=15, conditional=True)
+        response.raise_for_status()
+        tree_data = response.json()
+        if tree_data.get("truncated"):
+            # GitHub caps recursive trees (~100k entries / 7 MB). What we got is still usable for selection.
+            print(f"Warning: Tree for {owner}/{repo_name} was truncated by GitHub. Using the partial listing.")
+        return {"error": None, "data": tree_data.get("tree", []), "sha": tree_data.get("sha"), "truncated": bool(tree_data.get("truncated"))}
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (404, 409):
+            # 409 'Git Repository is empty.' / 404 unknown ref: nothing to select from.
+            print(f"Repository {owner}/{repo_name} has no tree at '{tree_ref}' ({e.response.status_code}).")
+            return {"error": None, "data": [], "sha": None, "truncated": False}
+        return {"error": format_github_api_error(e), "data": [], "sha": None, "truncated": False}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {e}", "data": [], "sha": None, "truncated": False}
+
+
+def list_tree_directory(tree_items: list[dict], path: str = ""):
+    """Returns the direct children of `path` from a recursive tree listing, shaped like Contents API items."""
+    prefix = f"{path.strip('/')}/" if path.strip("/") else ""
+    children = []
+    for entry in tree_items:
+        entry_path = entry.get("path", "")
+        if not entry_path.startswith(prefix):
+            continue
+        name = entry_path[len(prefix):]
+        if not name or "/" in name:
+            continue
+        children.append({
+            "name": name,
+            "path": entry_path,
+            "type": "dir" if entry.get("type") == "tree" else "file" if entry.get("type") == "blob" else entry.get("type"),
+            "size": entry.get("size", 0),
+            "sha": entry.get("sha"),
+            "url": entry.get("url"),
+        })
+    children.sort(key=lambda x: (x['type'] != 'dir', x['name'].lower()))
+    return children
+
+
+async def _fetch_tree_file_text(token: str, item: dict):
+    """Downloads a tree item's content from the Git Blobs API using the raw media type."""
+    return await fetch_raw_file_content_from_url(token, item.get("url"), accept=GITHUB_RAW_MEDIA_TYPE)
+
+
+async def fetch_repo_archive_files(token: str, owner: str, repo_name: str, wanted_paths: set, archive_ref: str = "HEAD"):
+    """
+    Streams the repository tarball once and extracts only `wanted_paths` as text, in memory.
+    Stops reading as soon as every wanted file has been seen. Returns {path: content_result}.
+    """
+    headers = get_github_api_headers(token)
+    url = f"{GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/tarball/{quote(archive_ref)}"
+    print(f"Streaming archive for {owner}/{repo_name} ({len(wanted_paths)} files wanted) from {url}")
+    remaining_paths = set(wanted_paths)
+    # GitHub tarballs wrap everything in a single '<owner>-<repo>-<sha>/' directory
+    reader = TarGzStreamReader(lambda path, size: path in remaining_paths and size <= MAX_FILE_SIZE_FOR_CONTEXT_BYTES, strip_components=1)
+    extracted = {}
+    try:
+        async with github_client.stream(url, headers=headers, timeout=60) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                for path, data in reader.feed(chunk):
+                    remaining_paths.discard(path)
+                    try:
+                        extracted[path] = {"error": None, "data": data.decode('utf-8'), "is_binary": False}
+                    except UnicodeDecodeError:
+                        extracted[path] = {"error": "File is binary or not UTF-8 decodable.", "data": None, "is_binary": True}
+                if not remaining_paths or reader.finished:
+                    break
+    except httpx.HTTPStatusError as e:
+        return {"error": format_github_api_error(e), "data": extracted}
+    except httpx.HTTPError as e:
+        return {"error": f"Archive request failed: {e}", "data": extracted}
+    except zlib.error as e:
+        return {"error": f"Archive could not be decompressed: {e}", "data": extracted}
+    print(f"Extracted {len(extracted)}/{len(wanted_paths)} wanted files from the {owner}/{repo_name} archive.")
+    return {"error": None, "data": extracted}
+
+
+def _choose_ingestion_mode(tree_items: list[dict], candidate_count: int):
+    """Picks 'files' or 'archive' for a repo, resolving the 'auto' setting from tree metadata."""
+    if GITHUB_CONTEXT_INGESTION_MODE != "auto":
+        return GITHUB_CONTEXT_INGESTION_MODE
+    # The uncompressed tarball is roughly the sum of all blob sizes
+    repo_bytes = sum(entry.get("size", 0) for entry in tree_items if entry.get("type") == "blob")
+    if candidate_count >= GITHUB_ARCHIVE_INGESTION_MIN_FILES and repo_bytes <= GITHUB_ARCHIVE_INGESTION_MAX_REPO_BYTES:
+        return "archive"
+    return "files"
+
+
+async def get_repo_context_documents(token: str, owner: str, repo_name: str, max_files_to_check=20):
+    """
+    Fetches content from the files that the selector scores highest across the whole repository tree,
+    respecting MAX_CONSOLIDATED_TEXT_LENGTH_CHARS across all of them.
+    The file list comes from one recursive tree request and files are chosen from that metadata before
+    anything is downloaded. Blobs already in the blob store are read locally; the rest are downloaded
+    one by one ('files') or pulled from a single tarball stream ('archive').
+    Returns a list of {"path", "sha", "text", "truncated"} dicts in context order.
+    """
+    print(f"Collecting context documents in {owner}/{repo_name}")
+    documents = []
     current_length = 0
     files_processed_count = 0
 
-    # Path Traversal Logic: Explore root, then common dirs like 'src', 'lib'
-    # This is a simplified traversal. A full recursive traversal could be too slow/complex for this prototype.
-    paths_to_check = [""] # Start with root
-    
-    # Basic check for common source directories - could be expanded
-    # We do a quick list of root to see if 'src' or 'lib' exist without deep scan
-    root_contents_result = fetch_repo_contents_list(token, owner, repo_name, path="")
-    if not root_contents_result["error"] and root_contents_result["data"]:
-        for item in root_contents_result["data"]:
-            if item.get("type") == "dir" and item.get("name", "").lower() in ["src", "lib", "app", "source"]:
-                paths_to_check.append(item.get("name"))
-
-    # Priority: README files first from any checked path
-    readme_found_and_added = False
-    for path_prefix in paths_to_check:
-        if readme_found_and_added or current_length >= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS:
-            break
-        contents_result = fetch_repo_contents_list(token, owner, repo_name, path=path_prefix)
-        if not contents_result["error"] and contents_result["data"]:
-            for item in contents_result["data"]:
-                if files_processed_count >= max_files_to_check or current_length >= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS:
-                    break
-                if item.get("type") == "file" and item.get("name", "").lower().startswith("readme"):
-                    if item.get("size", 0) <= MAX_FILE_SIZE_FOR_CONTEXT_BYTES and item.get("download_url"):
-                        content_result = fetch_raw_file_content_from_url(token, item.get("download_url"))
-                        if not content_result["error"] and not content_result["is_binary"] and content_result["data"]:
-                            text_to_add = f"\n\n--- Content from: {item['path']} ---\n{content_result['data']}"
-                            if current_length + len(text_to_add) <= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS:
-                                consolidated_text += text_to_add
-                                current_length += len(text_to_add)
-                                files_processed_count += 1
-                                readme_found_and_added = True # Prioritize one good README
-                                print(f"Added {item['path']} to context.")
-                                break # Stop looking for READMEs if one good one is found
-            if readme_found_and_added: break
-
-
-    # Then, other common text files
-    common_extensions = ('.py', '.js', '.ts', '.java', '.go', '.rb', '.php', '.md', '.txt', 
-                         '.json', '.yaml', '.yml', '.xml', '.html', '.css', '.sh', '.R', '.scala', '.kt', '.swift', '.c', '.cpp', '.h', '.cs')
-
-    for path_prefix in paths_to_check: # Iterate through root, then 'src', etc.
+    tree_result = await fetch_repo_tree(token, owner, repo_name)
+    if tree_result["error"]:
+        print(f"Could not fetch tree for {owner}/{repo_name}: {tree_result['error']}")
+        return []
+    selected_files = select_context_files(tree_result["data"], MAX_CONSOLIDATED_TEXT_LENGTH_CHARS, max_files_to_check)
+
+    stored_texts = {}
+    fetched_texts = {} # sha -> text downloaded in this call, written to the blob store in one batch at the end
+    if blob_store is not None:
+        # One lookup for all selected blobs, in a worker thread so SQLite never blocks the event loop
+        texts_by_sha = await asyncio.to_thread(blob_store.get_texts, [item.get("sha") for item in selected_files])
+        stored_texts = {item["path"]: texts_by_sha[item["sha"]] for item in selected_files if item.get("sha") in texts_by_sha}
+        if stored_texts:
+            print(f"Blob store has {len(stored_texts)} of the selected files for {owner}/{repo_name}.")
+
+    missing_files = [item for item in selected_files if item["path"] not in stored_texts]
+    ingestion_mode = _choose_ingestion_mode(tree_result["data"], len(missing_files))
+    archive_contents = None
+    if ingestion_mode == "archive" and missing_files:
+        archive_result = await fetch_repo_archive_files(
+            token, owner, repo_name, {item["path"] for item in missing_files}
+        )
+        if archive_result["error"]:
+            print(f"Archive ingestion failed for {owner}/{repo_name} ({archive_result['error']}). Falling back to per-file downloads.")
+        else:
+            archive_contents = archive_result["data"]
+
+    async def load_text(item: dict):
+        if item["path"] in stored_texts:
+            return {"error": None, "data": stored_texts[item["path"]], "is_binary": False}
+        if archive_contents is not None:
+            content_result = archive_contents.get(item["path"]) or {"error": "File not found in archive.", "data": None, "is_binary": False}
+        elif not item.get("url"):
+            return {"error": "No download URL provided.", "data": None, "is_binary": False}
+        else:
+            content_result = await _fetch_tree_file_text(token, item)
+        if blob_store is not None and not content_result["error"] and content_result["data"] is not None and item.get("sha"):
+            fetched_texts[item["sha"]] = content_result["data"]
+        return content_result
+
+    def add_document(item: dict, text: str, truncated: bool = False):
+        nonlocal current_length, files_processed_count
+        documents.append({"path": item["path"], "sha": item.get("sha"), "text": text, "truncated": truncated})
+        current_length += len(f"\n\n--- Content from: {item['path']} ---\n{text}")
+        files_processed_count += 1
+        print(f"Added {'truncated ' if truncated else ''}{item['path']} to context (score {item['score']}).")
+
+    # Selected files arrive highest score first, so the project README leads the context
+    for item in selected_files:
         if current_length >= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS or files_processed_count >= max_files_to_check:
             break
-        
-        contents_result = fetch_repo_contents_list(token, owner, repo_name, path=path_prefix)
-        if contents_result["error"] or not contents_result["data"]:
-            continue
 
-        # Sort files by a heuristic (e.g., common names like main, app, index, then by size)
-        # This is a simple sort, can be improved.
-        sorted_files = sorted(
-            [item for item in contents_result["data"] if item.get("type") == "file"],
-            key=lambda x: (
-                0 if x.get("name", "").lower() in ["main.py", "app.py", "index.js", "server.js"] else 1,
-                x.get("size", float('inf')) # Smaller files next if not primary
-            )
-        )
+        content_result = await load_text(item)
+        if not content_result["error"] and not content_result["is_binary"] and content_result["data"]:
+            text_to_add = f"\n\n--- Content from: {item['path']} ---\n{content_result['data']}"
+            if current_length + len(text_to_add) <= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS:
+                add_document(item, content_result["data"])
+            else:
+                # Try adding a truncated version if it doesn't fit fully (sizes are bytes, text is chars)
+                remaining_space = MAX_CONSOLIDATED_TEXT_LENGTH_CHARS - current_length
+                if remaining_space > 200: # Only add if a meaningful snippet can fit
+                    truncated_content = content_result['data'][:(remaining_space - len(f"\n\n--- Content from: {item['path']} ---\n... (truncated)"))] + "... (truncated)"
+                    add_document(item, truncated_content, truncated=True)
+                break # Stop adding more files if we hit the consolidated limit
 
-        for item in sorted_files:
-            if current_length >= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS or files_processed_count >= max_files_to_check:
-                break
-            
-            file_name_lower = item.get("name", "").lower()
-            if file_name_lower.startswith("readme") and readme_found_and_added: # Skip if we already got a README
-                continue
-
-            if file_name_lower.endswith(common_extensions):
-                if item.get("size", 0) <= MAX_FILE_SIZE_FOR_CONTEXT_BYTES and item.get("download_url"):
-                    content_result = fetch_raw_file_content_from_url(token, item.get("download_url"))
-                    if not content_result["error"] and not content_result["is_binary"] and content_result["data"]:
-                        text_to_add = f"\n\n--- Content from: {item['path']} ---\n{content_result['data']}"
-                        if current_length + len(text_to_add) <= MAX_CONSOLIDATED_TEXT_LENGTH_CHARS:
-                            consolidated_text += text_to_add
-                            current_length += len(text_to_add)
-                            files_processed_count += 1
-                            print(f"Added {item['path']} to context.")
-                        else:
-                            # Try adding a truncated version if it doesn't fit fully
-                            remaining_space = MAX_CONSOLIDATED_TEXT_LENGTH_CHARS - current_length
-                            if remaining_space > 200: # Only add if a meaningful snippet can fit
-                                truncated_content = content_result['data'][:(remaining_space - len(f"\n\n--- Content from: {item['path']} ---\n... (truncated)"))] + "... (truncated)"
-                                text_to_add_truncated = f"\n\n--- Content from: {item['path']} ---\n{truncated_content}"
-                                consolidated_text += text_to_add_truncated
-                                current_length += len(text_to_add_truncated)
-                                files_processed_count += 1
-                                print(f"Added truncated {item['path']} to context.")
-                            break # Stop adding more files if we hit the consolidated limit
-    
-    if not consolidated_text.strip():
+    if fetched_texts:
+        await asyncio.to_thread(blob_store.put_texts, fetched_texts)
+
+    if not any(document["text"].strip() for document in documents):
         print(f"No suitable text files found or fetched for context consolidation in {owner}/{repo_name}.")
-        return None
+        return []
+
+    print(f"Context for {owner}/{repo_name}: {current_length} chars from {files_processed_count} file portions "
+          f"({len([d for d in documents if d['path'] in stored_texts])} from blob store, {'archive' if archive_contents is not None else 'files'} mode).")
+    return documents
+
 
-    print(f"Consolidated text length for {owner}/{repo_name}: {len(consolidated_text)} chars from {files_processed_count} file portions.")
-    return consolidated_text.strip()
+def format_context_document(document: dict) -> str:
+    """Renders one context document with its file header (the form in which it is chunked and embedded)."""
+    return f"--- Content from: {document['path']} ---\n{document['text']}"
@@ -0,0 +1,101 @@
+import math
+import re
+from array import array
+
+import numpy as np
+
+from config import BM25_K1, BM25_B
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_SUBWORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased terms for code and prose. Identifiers are kept whole and also split into their
+    camelCase / snake_case parts, so `getUserName` matches 'getusername', 'user' and 'name'.
+    """
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lowered = word.lower()
+        if len(lowered) > 1 and lowered not in _STOPWORDS:
+            terms.append(lowered)
+        parts = _SUBWORD_RE.findall(word)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts if len(part) > 1 and part.lower() not in _STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """
+    Incremental BM25 inverted index over the chunks of one repository partition.
+    Postings are compact int arrays of (row, term frequency); rows map back to document IDs.
+    Scoring only touches the postings of the query terms.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._doc_ids = array("q")
+        self._doc_lengths = array("i")
+        self._total_length = 0
+        self._postings = {} # term -> (array of rows, array of term frequencies)
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def add(self, doc_ids, texts):
+        for doc_id, text in zip(doc_ids, texts):
+            row = len(self._doc_ids)
+            terms = tokenize(text)
+            self._doc_ids.append(int(doc_id))
+            self._doc_lengths.append(len(terms))
+            self._total_length += len(terms)
+            term_counts = {}
+            for term in terms:
+                term_counts[term] = term_counts.get(term, 0) + 1
+            for term, count in term_counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("i"), array("i"))
+                postings[0].append(row)
+                postings[1].append(count)
+
+    def search(self, query_text: str, k: int):
+        """Returns up to k document IDs ranked by BM25 score (documents sharing no term are left out)."""
+        doc_count = len(self._doc_ids)
+        if doc_count == 0 or k <= 0:
+            return []
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.int32)
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(self._total_length / doc_count, 1e-9))
+        scores = np.zeros(doc_count, dtype=np.float32)
+        for term in set(tokenize(query_text)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            rows = np.frombuffer(postings[0], dtype=np.int32)
+            tfs = np.frombuffer(postings[1], dtype=np.int32).astype(np.float32)
+            idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[rows])
+        matched = np.nonzero(scores)[0]
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        doc_ids = np.frombuffer(self._doc_ids, dtype=np.int64)
+        return doc_ids[ranked].tolist()
+
+    def memory_bytes(self) -> int:
+        posting_bytes = sum(rows.itemsize * len(rows) * 2 for rows, _ in self._postings.values())
+        return posting_bytes + len(self._doc_ids) * 12
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = 60) -> list[int]:
+    """Fuses ranked ID lists: score(id) = sum of 1 / (k + rank) over the lists containing it."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
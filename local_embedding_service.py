@@ -1,24 +1,213 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import os
+import queue
+import threading
 import time # For potential delays if batch processing is very intensive
+from concurrent.futures import Future
 
-from config import LOCAL_EMBEDDING_MODEL_NAME, LOCAL_EMBEDDING_BATCH_SIZE
+from config import (
+    LOCAL_EMBEDDING_MODEL_NAME, LOCAL_EMBEDDING_BATCH_SIZE, DEFAULT_EMBEDDING_DIMENSION,
+    LOCAL_EMBEDDING_WORKER_ENABLED, LOCAL_EMBEDDING_BATCH_WINDOW_MS, LOCAL_EMBEDDING_MAX_COALESCED_TEXTS,
+    LOCAL_EMBEDDING_BACKEND, LOCAL_EMBEDDING_ONNX_QUANTIZATION, LOCAL_EMBEDDING_ONNX_EXPORT_DIR, LOCAL_EMBEDDING_NUM_THREADS,
+)
+
+
+def onnx_quantized_file_name(quantization: str) -> str:
+    """File name sentence-transformers uses for a dynamically quantized ONNX export (e.g. onnx/model_qint8_avx512.onnx)."""
+    weights_dtype = "quint8" if quantization == "avx2" else "qint8"
+    return f"onnx/model_{weights_dtype}_{quantization}.onnx"
+
+
+def local_embedding_variant(backend: str = LOCAL_EMBEDDING_BACKEND, quantization: str = LOCAL_EMBEDDING_ONNX_QUANTIZATION) -> str:
+    """
+    Suffix identifying vectors that differ from the reference model's, or "" if they match.
+    torch and fp32 ONNX produce the same vectors (up to float rounding); int8 quantization does not.
+    """
+    if backend == "onnx" and quantization:
+        return "onnx-" + os.path.basename(onnx_quantized_file_name(quantization))[len("model_"):-len(".onnx")]
+    return ""
+
+
+def load_local_embedding_model(model_name: str = LOCAL_EMBEDDING_MODEL_NAME, backend: str = LOCAL_EMBEDDING_BACKEND,
+                               quantization: str = LOCAL_EMBEDDING_ONNX_QUANTIZATION, num_threads: int = LOCAL_EMBEDDING_NUM_THREADS):
+    """
+    Builds the SentenceTransformer for the configured backend ("torch" or "onnx", optionally int8-quantized)
+    and checks that it produces DEFAULT_EMBEDDING_DIMENSION-sized vectors. Raises on failure.
+    """
+    from sentence_transformers import SentenceTransformer # Imports torch, the slow part of startup
+    if backend == "torch":
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        # Consider adding device='cpu' if you want to be explicit, though it's default
+        model = SentenceTransformer(model_name)
+    elif backend == "onnx":
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+        if not quantization:
+            model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+        else:
+            file_name = onnx_quantized_file_name(quantization)
+            try:
+                model = SentenceTransformer(model_name, backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name})
+            except Exception as e:
+                # Not shipped with the model: quantize the fp32 ONNX export once and reuse it from disk
+                export_dir = os.path.join(LOCAL_EMBEDDING_ONNX_EXPORT_DIR, model_name.replace("/", "__"))
+                if not os.path.exists(os.path.join(export_dir, file_name)):
+                    print(f"'{file_name}' not available for '{model_name}' ({e}). Exporting a quantized model to '{export_dir}'...")
+                    from sentence_transformers import export_dynamic_quantized_onnx_model
+                    fp32_model = SentenceTransformer(model_name, backend="onnx")
+                    fp32_model.save(export_dir)
+                    export_dynamic_quantized_onnx_model(fp32_model, quantization, export_dir)
+                model = SentenceTransformer(export_dir, backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name})
+    else:
+        raise ValueError(f"Unknown LOCAL_EMBEDDING_BACKEND '{backend}' (expected 'torch' or 'onnx').")
+    dimension = model.get_sentence_embedding_dimension()
+    if dimension != DEFAULT_EMBEDDING_DIMENSION:
+        raise ValueError(f"Model '{model_name}' produces {dimension}-dimensional vectors, but DEFAULT_EMBEDDING_DIMENSION is {DEFAULT_EMBEDDING_DIMENSION}.")
+    return model
+
+
+class LocalModelLoader:
+    """
+    Loads the Sentence Transformer model (and torch) on a background thread, so importing this module
+    and starting the web server stay fast. Only callers that need embeddings wait for it.
+    """
+
+    def __init__(self, model_name: str, backend: str = LOCAL_EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self._started = False
+        self._loaded = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Begins loading in the background (no-op if already started)."""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._load, name="local-model-loader", daemon=True).start()
+
+    def _load(self):
+        started = time.time()
+        try:
+            print(f"Loading local Sentence Transformer model: {self.model_name} ({self.backend} backend)...")
+            self.model = load_local_embedding_model(self.model_name, self.backend)
+            self.load_seconds = time.time() - started
+            print(f"Local model '{self.model_name}' loaded successfully in {self.load_seconds:.1f}s.")
+        except Exception as e:
+            self.error = str(e)
+            print(f"CRITICAL ERROR: Failed to load local Sentence Transformer model '{self.model_name}'. Local embeddings will not work. Error: {e}")
+        finally:
+            self._loaded.set()
+
+    def get_model(self, timeout: float = None):
+        """Starts loading if needed and blocks until the model is loaded; returns None if loading failed or timed out."""
+        self.start()
+        self._loaded.wait(timeout)
+        return self.model
+
+    def status(self) -> dict:
+        if not self._started:
+            state = "not_started"
+        elif not self._loaded.is_set():
+            state = "loading"
+        else:
+            state = "ready" if self.model is not None else "failed"
+        return {"model": self.model_name, "backend": self.backend, "variant": local_embedding_variant(self.backend), "status": state, "error": self.error, "load_seconds": self.load_seconds}
+
+
+local_model_loader = LocalModelLoader(LOCAL_EMBEDDING_MODEL_NAME)
+
+
+class LocalEmbeddingWorker:
+    """
+    Single thread that owns all encode calls of the local model.
+    Callers (any thread) submit a list of texts and get a Future; requests arriving within a short window
+    are coalesced, de-duplicated and encoded longest-first in LOCAL_EMBEDDING_BATCH_SIZE batches,
+    then each caller's rows are handed back through its Future. Concurrent jobs therefore share
+    full batches instead of running competing encodes on the same cores.
+    """
+
+    def __init__(self, model, batch_window_seconds: float, max_coalesced_texts: int):
+        self.model = model
+        self.batch_window_seconds = batch_window_seconds
+        self.max_coalesced_texts = max_coalesced_texts
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, texts: list[str]) -> Future:
+        """Queues texts for embedding; the Future resolves to a float32 array of shape (len(texts), dim)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="local-embedding-worker", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            coalesced_texts = len(pending[0][0])
+            deadline = time.monotonic() + self.batch_window_seconds
+            while coalesced_texts < self.max_coalesced_texts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(request)
+                coalesced_texts += len(request[0])
+            self._encode_requests(pending)
+
+    def _encode_requests(self, pending: list):
+        pending = [(texts, future) for texts, future in pending if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        # Longest first, so each batch pads to similar lengths; identical texts are encoded once
+        unique_texts = sorted(dict.fromkeys(text for texts, _ in pending for text in texts), key=len, reverse=True)
+        try:
+            started = time.time()
+            vectors = self.model.encode(unique_texts, batch_size=LOCAL_EMBEDDING_BATCH_SIZE, show_progress_bar=False)
+            print(f"Embedding worker: encoded {len(unique_texts)} texts for {len(pending)} request(s) in {time.time() - started:.2f}s.")
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        rows = {text: i for i, text in enumerate(unique_texts)}
+        for texts, future in pending:
+            future.set_result(np.asarray(vectors[[rows[text] for text in texts]], dtype=np.float32))
+
+
+_local_embedding_worker = None
+_worker_lock = threading.Lock()
+
+
+def _get_local_embedding_worker(model):
+    global _local_embedding_worker
+    with _worker_lock:
+        if _local_embedding_worker is None:
+            _local_embedding_worker = LocalEmbeddingWorker(model, LOCAL_EMBEDDING_BATCH_WINDOW_MS / 1000, LOCAL_EMBEDDING_MAX_COALESCED_TEXTS)
+        return _local_embedding_worker
 
-# Load the Sentence Transformer model globally on module import
-# This means it's loaded once when the application starts.
-try:
-    print(f"Loading local Sentence Transformer model: {LOCAL_EMBEDDING_MODEL_NAME}...")
-    # Consider adding device='cpu' if you want to be explicit, though it's default
-    local_embedder_model = SentenceTransformer(LOCAL_EMBEDDING_MODEL_NAME)
-    print(f"Local model '{LOCAL_EMBEDDING_MODEL_NAME}' loaded successfully.")
-except Exception as e:
-    local_embedder_model = None
-    print(f"CRITICAL ERROR: Failed to load local Sentence Transformer model '{LOCAL_EMBEDDING_MODEL_NAME}'. Local embeddings will not work. Error: {e}")
 
 def generate_local_embeddings_batch(texts: list[str]):
     """
     Generates embeddings locally for a batch of texts using Sentence Transformers.
+    Waits for the background model load if it has not finished yet.
     """
+    local_embedder_model = local_model_loader.get_model()
     if not local_embedder_model:
         return {"error": f"Local embedding model '{LOCAL_EMBEDDING_MODEL_NAME}' not loaded.", "embeddings": None}
     if not texts or not all(isinstance(t, str) for t in texts):
@@ -26,9 +215,13 @@ def generate_local_embeddings_batch(texts: list[str]):
 
     print(f"Generating local embeddings for a batch of {len(texts)} texts...")
     try:
-        # The encode method can take a list of sentences.
-        # convert_to_numpy=True is default, returns ndarray.
-        embeddings_np = local_embedder_model.encode(texts, batch_size=LOCAL_EMBEDDING_BATCH_SIZE, show_progress_bar=False)
+        if LOCAL_EMBEDDING_WORKER_ENABLED:
+            # Blocks this caller's thread until the shared worker has encoded its texts
+            embeddings_np = _get_local_embedding_worker(local_embedder_model).submit(texts).result()
+        else:
+            # The encode method can take a list of sentences.
+            # convert_to_numpy=True is default, returns ndarray.
+            embeddings_np = local_embedder_model.encode(texts, batch_size=LOCAL_EMBEDDING_BATCH_SIZE, show_progress_bar=False)
         # Convert to list of lists for easier handling / JSON if needed
         return {"error": None, "embeddings": embeddings_np.tolist()}
     except Exception as e:
@@ -1,6 +1,6 @@
 import uvicorn
 from fastapi import FastAPI, Request, Form, Query, Cookie, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.templating import Jinja2Templates 
 from typing import Optional, List, AsyncGenerator
 import os
@@ -10,24 +10,27 @@ import html as html_escaper
 import asyncio 
 import uuid 
 import json 
-import requests 
+import httpx 
 
 import config 
 from config import (
     APP_TITLE, APP_VERSION, GOOGLE_API_KEY,
-    MAX_REPOS_TO_DISPLAY_FOR_SELECTION,
     AUTO_SELECT_PROCESS_COUNT, AUTO_SELECT_FINAL_OUTPUT_COUNT,
     MAX_MANUAL_SELECT_REPOS_FOR_CV,
     USE_LOCAL_EMBEDDINGS 
 )
 from github_service import (
-    fetch_user_repos, fetch_repo_contents_list,
-    fetch_raw_file_content_from_url, get_github_api_headers 
+    fetch_user_repos, fetch_file_content, get_github_api_headers 
 )
+from repo_tree_cache import repo_tree_cache 
+from github_client import github_client 
 from cv_generator_logic import orchestrate_cv_generation_for_repos 
+from vector_store_registry import vector_store_registry
+from embedding_cache import embedding_cache
 from utils import escape_html_chars, markdown_to_html, format_github_api_error 
-from vector_store_service import load_vector_store 
-from local_embedding_service import local_embedder_model 
+from local_embedding_service import local_model_loader
+from gemini_service import gemini_generation_configured
+from vector_store_service import faiss
 
 app = FastAPI(title=APP_TITLE, version=APP_VERSION)
 
@@ -51,15 +54,49 @@ async def startup_event():
         print("CRITICAL WARNING: GOOGLE_API_KEY not set. CV Generation (Gemini) will NOT work.")
     else:
         print("GOOGLE_API_KEY found.")
-    if local_embedder_model is None and USE_LOCAL_EMBEDDINGS: 
-         print("CRITICAL WARNING: Local embedding model failed to load. CV context building will not work correctly.")
-    elif USE_LOCAL_EMBEDDINGS: 
-        print(f"Using local embeddings with model: {config.LOCAL_EMBEDDING_MODEL_NAME}")
+    if USE_LOCAL_EMBEDDINGS: 
+        # Loaded in the background; pages are served meanwhile and only CV generation waits for it
+        local_model_loader.start()
+        print(f"Using local embeddings with model: {config.LOCAL_EMBEDDING_MODEL_NAME} (loading in background)")
     else:
         print(f"Using Gemini API for embeddings with model: {config.GEMINI_EMBEDDING_MODEL_NAME} (Rate limits apply!)")
-    
-    print("Attempting to load vector store from disk...")
-    load_vector_store() 
+    # Vector stores open lazily per user; changed ones are saved in the background
+    app.state.vector_store_flush_task = asyncio.create_task(vector_store_registry.run_periodic_flush())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.vector_store_flush_task.cancel()
+    print("Flushing vector stores to disk...")
+    await asyncio.to_thread(vector_store_registry.flush_all)
+    if embedding_cache is not None:
+        print(f"Embedding cache stats: {embedding_cache.stats()}")
+    await github_client.aclose()
+
+def _embedding_model_status():
+    if USE_LOCAL_EMBEDDINGS:
+        return local_model_loader.status()
+    return {"model": config.GEMINI_EMBEDDING_MODEL_NAME, "status": "ready" if gemini_generation_configured else "failed", "error": None if gemini_generation_configured else "Gemini SDK not configured."}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests (the model may still be loading)."""
+    return {"status": "ok", "app_version": APP_VERSION}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once CV generation can run without waiting (embedding model loaded, vector stores usable), else 503."""
+    embedding_model = _embedding_model_status()
+    vector_stores = await asyncio.to_thread(vector_store_registry.readiness)
+    flush_task = getattr(app.state, "vector_store_flush_task", None)
+    vector_stores["periodic_flush_running"] = flush_task is not None and not flush_task.done()
+    components = {
+        "embedding_model": embedding_model,
+        # Without FAISS the partitions use exact NumPy search, so this never blocks readiness
+        "faiss": {"available": faiss is not None, "backend": "faiss" if faiss else "numpy"},
+        "vector_stores": vector_stores,
+    }
+    ready = embedding_model["status"] == "ready" and vector_stores["status"] == "ready"
+    return JSONResponse({"ready": ready, "components": components}, status_code=200 if ready else 503)
 
 async def get_github_pat(request: Request, github_pat: Optional[str] = Cookie(None)):
     return github_pat
@@ -81,13 +118,13 @@ async def set_github_token(request: Request, token: str = Form(...)):
     
     headers = get_github_api_headers(token)
     try:
-        response = await asyncio.to_thread(requests.get, f"{config.GITHUB_API_BASE_URL}/user", headers=headers, timeout=5)
+        response = await github_client.get(f"{config.GITHUB_API_BASE_URL}/user", headers=headers, timeout=5)
         response.raise_for_status() 
         user_data = response.json()
         print(f"Successfully validated PAT for user: {user_data.get('login', 'Unknown')}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_msg_detail = str(e)
-        if isinstance(e, requests.exceptions.HTTPError):
+        if isinstance(e, httpx.HTTPStatusError):
             error_msg_detail = format_github_api_error(e)
         error_msg = quote(f"Invalid GitHub PAT or API error: {error_msg_detail}")
         print(f"PAT validation failed: {e}")
@@ -108,18 +145,18 @@ async def list_repositories_page(request: Request, github_pat: Optional[str] = D
         return RedirectResponse(url=f"/?error={error_msg}", status_code=303)
 
     if app.state.user_repos_cache is None:
-        result = await asyncio.to_thread(fetch_user_repos, github_pat) 
+        result = await fetch_user_repos(github_pat) 
         if result["error"]:
              error_message_for_template = f'{escape_html_chars(result["error"])} You might need to re-enter your token.'
              repos_to_display = [] 
              app.state.user_repos_cache = None 
         else:
             app.state.user_repos_cache = result["data"] 
-            repos_to_display = result["data"][:MAX_REPOS_TO_DISPLAY_FOR_SELECTION] 
+            repos_to_display = result["data"] # Every repo is listed; the page filters them client-side
             error_message_for_template = unquote(error) if error else None 
     else:
         print("Using cached repository list.")
-        repos_to_display = app.state.user_repos_cache[:MAX_REPOS_TO_DISPLAY_FOR_SELECTION]
+        repos_to_display = app.state.user_repos_cache
         error_message_for_template = unquote(error) if error else None 
 
     repo_cards_html = ""
@@ -141,8 +178,9 @@ async def list_repositories_page(request: Request, github_pat: Optional[str] = D
             description_escaped = escape_html_chars(description_raw[:120] + "..." if description_raw and len(description_raw) > 120 else description_raw or "No description provided.")
             star_count = repo.get("stargazers_count", 0)
             fork_count = repo.get("forks_count", 0)
+            filter_text_escaped = escape_html_chars(f"{repo_full_name} {language or ''} {description_raw or ''}".lower())
             card_items.append(f'''
-<div class="bg-white rounded-xl shadow-lg border border-slate-200 hover:shadow-xl transition-shadow duration-300 ease-in-out flex flex-col overflow-hidden">
+<div data-repo-card data-filter-text="{filter_text_escaped}" class="bg-white rounded-xl shadow-lg border border-slate-200 hover:shadow-xl transition-shadow duration-300 ease-in-out flex flex-col overflow-hidden">
     <div class="p-5 sm:p-6 flex-grow">
         <div class="flex items-start space-x-3 mb-3">
             <input type="checkbox" name="selected_repos" value="{repo_full_name_escaped}" class="h-5 w-5 text-primary-DEFAULT border-slate-300 rounded focus:ring-primary-DEFAULT mt-1 cursor-pointer">
@@ -162,7 +200,7 @@ async def list_repositories_page(request: Request, github_pat: Optional[str] = D
         repo_cards_html = "".join(card_items)
         
     return templates.TemplateResponse("repo_list.html", {
-        "request": request, "error_message": error_message_for_template, "repo_cards_html": repo_cards_html,
+        "request": request, "error_message": error_message_for_template, "repo_cards_html": repo_cards_html, "repo_count": len(repos_to_display),
         "max_manual_select_repos": MAX_MANUAL_SELECT_REPOS_FOR_CV, "auto_select_process_count": AUTO_SELECT_PROCESS_COUNT,
         "auto_select_output_count": AUTO_SELECT_FINAL_OUTPUT_COUNT, "app_title": APP_TITLE, "app_version": APP_VERSION,
     })
@@ -171,7 +209,7 @@ async def list_repositories_page(request: Request, github_pat: Optional[str] = D
 async def view_repo_directory_contents(request: Request, owner: str, repo_name: str, path: str = Query(""), github_pat: Optional[str] = Depends(get_github_pat)):
     if not github_pat: return RedirectResponse(url=f"/?error={quote('GitHub PAT not found or expired. Please connect again.')}", status_code=303)
     current_path_unquoted = unquote(path)
-    result = await asyncio.to_thread(fetch_repo_contents_list, github_pat, owner, repo_name, current_path_unquoted)
+    result = await repo_tree_cache.get_directory_listing(github_pat, owner, repo_name, current_path_unquoted)
     content_list_html_items, error_message_for_template = "", None
     if result["error"]: error_message_for_template = escape_html_chars(result["error"])
     elif result["data"]:
@@ -193,35 +231,30 @@ async def view_repo_directory_contents(request: Request, owner: str, repo_name:
 @app.get("/repo/{owner}/{repo_name}/file", response_class=HTMLResponse)
 async def view_single_file_content(request: Request, owner: str, repo_name: str, path: str = Query(...), github_pat: Optional[str] = Depends(get_github_pat)):
     if not github_pat: return RedirectResponse(url=f"/?error={quote('GitHub PAT not found or expired. Please connect again.')}", status_code=303)
-    file_path_unquoted, error_message_for_template, file_content_display_html, is_binary_msg, download_url = unquote(path), None, "", False, None
-    headers, encoded_file_path = get_github_api_headers(github_pat), quote(file_path_unquoted)
-    file_url = f"{config.GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/contents/{encoded_file_path}"
-    try:
-        response = await asyncio.to_thread(requests.get, file_url, headers=headers, timeout=10); response.raise_for_status(); file_item_response = response.json()
-        if isinstance(file_item_response, list) or file_item_response.get("type") != "file": error_message_for_template = f'Path "{escape_html_chars(file_path_unquoted)}" is not a regular file.'
-        else: 
-            download_url = file_item_response.get("download_url")
-            if not download_url: # Corrected assignment for error message
-                 error_message_for_template = f'File "{escape_html_chars(os.path.basename(file_path_unquoted))}" found, but no download URL.'
-    except requests.exceptions.HTTPError as e: error_message_for_template = format_github_api_error(e)
-    except requests.exceptions.RequestException as e: error_message_for_template = f"Request failed: {e}"
-    except json.JSONDecodeError: error_message_for_template = "Failed to parse API response."
-    if download_url:
-        content_result = await asyncio.to_thread(fetch_raw_file_content_from_url, github_pat, download_url)
-        if content_result["error"]: error_message_for_template = (error_message_for_template + " | " if error_message_for_template else "") + escape_html_chars(content_result["error"])
-        elif content_result.get("is_binary"): is_binary_msg, file_content_display_html = True, f"<p class='italic text-slate-500'>Binary file content cannot be displayed. <a href='{escape_html_chars(download_url)}' target='_blank' rel='noopener noreferrer' class='text-primary-DEFAULT hover:underline font-medium'>Download file</a>.</p>"
-        else: file_content_display_html = escape_html_chars(content_result.get('data', ''))
+    file_path_unquoted, error_message_for_template, file_content_display_html, is_binary_msg = unquote(path), None, "", False
+    # The file is read at the commit the browsed tree was cached at (usually no extra request), so the page,
+    # its directory listing and the download link all describe the same version even if the branch moves
+    commit_result = await repo_tree_cache.get_commit_sha(github_pat, owner, repo_name)
+    commit_ref = commit_result["data"] or "HEAD"
+    # One request: the Contents API with the raw media type returns the file body directly
+    content_result = await fetch_file_content(github_pat, owner, repo_name, file_path_unquoted, ref=commit_result["data"])
+    if content_result["error"]: error_message_for_template = escape_html_chars(content_result["error"])
+    elif content_result["not_a_file"]: error_message_for_template = f'Path "{escape_html_chars(file_path_unquoted)}" is not a regular file.'
+    elif content_result["is_binary"]:
+        download_url = f"https://github.com/{quote(owner)}/{quote(repo_name)}/raw/{quote(commit_ref)}/{quote(file_path_unquoted)}"
+        is_binary_msg, file_content_display_html = True, f"<p class='italic text-slate-500'>Binary file content cannot be displayed. <a href='{escape_html_chars(download_url)}' target='_blank' rel='noopener noreferrer' class='text-primary-DEFAULT hover:underline font-medium'>Download file</a>.</p>"
+    else: file_content_display_html = escape_html_chars(content_result.get('data', ''))
     return templates.TemplateResponse("file_view.html", {"request": request, "file_path_display": escape_html_chars(file_path_unquoted), "repo_full_name": escape_html_chars(f"{owner}/{repo_name}"), "error_message": error_message_for_template, "back_to_dir_link": f'/repo/{owner}/{repo_name}?path={quote(os.path.dirname(file_path_unquoted))}', "file_content_display_html": file_content_display_html, "is_binary_file_message": is_binary_msg, "app_title": APP_TITLE, "app_version": APP_VERSION})
 
 @app.post("/generate-cv-summary")
 async def initiate_cv_generation(request: Request, github_pat: Optional[str] = Depends(get_github_pat), action_type: str = Form(...), selected_repo_names: Optional[List[str]] = Form(None)):
     if not github_pat: return RedirectResponse(url=f"/?error={quote('GitHub PAT not found or expired. Please connect again.')}", status_code=303)
     if not GOOGLE_API_KEY: return RedirectResponse(url=f"/repos?error={quote('Google API Key not configured. CV generation feature is disabled.')}", status_code=303)
-    if local_embedder_model is None and config.USE_LOCAL_EMBEDDINGS: return RedirectResponse(url=f"/repos?error={quote('Local embedding model failed to load. CV context building will not work.')}", status_code=303)
+    if config.USE_LOCAL_EMBEDDINGS and local_model_loader.status()["status"] == "failed": return RedirectResponse(url=f"/repos?error={quote('Local embedding model failed to load. CV context building will not work.')}", status_code=303)
     
     all_fetched_repos = getattr(app.state, 'user_repos_cache', None)
     if not all_fetched_repos:
-        fetch_result = await asyncio.to_thread(fetch_user_repos, github_pat)
+        fetch_result = await fetch_user_repos(github_pat)
         if fetch_result["error"] or not fetch_result["data"]:
             error_detail = escape_html_chars(fetch_result.get("error", "No data"))
             error_url = f"/repos?error={quote(f'Could not fetch repositories: {error_detail}')}"
@@ -365,6 +398,6 @@ if __name__ == "__main__":
         os.chdir(script_dir)
         uvicorn.run(app_module_path, host="127.0.0.1", port=8000, reload=True, reload_dirs=reload_paths)
     except ImportError as e:
-        print(f"ImportError: {e}. Could not run uvicorn. Is it installed and in PATH?\nTry: pip install uvicorn[standard] fastapi jinja2 python-dotenv requests google-generativeai sentence-transformers faiss-cpu numpy markdown\nTo run manually from project root (directory containing 'cv'): uvicorn cv.main:app --reload --host 127.0.0.1 --port 8000 --reload-dir cv")
+        print(f"ImportError: {e}. Could not run uvicorn. Is it installed and in PATH?\nTry: pip install uvicorn[standard] fastapi jinja2 python-dotenv httpx[http2] google-generativeai sentence-transformers faiss-cpu numpy markdown\nTo run manually from project root (directory containing 'cv'): uvicorn cv.main:app --reload --host 127.0.0.1 --port 8000 --reload-dir cv")
     except Exception as e:
         print(f"An error occurred: {e}")
\ No newline at end of file
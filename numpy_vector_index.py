@@ -0,0 +1,84 @@
+import numpy as np
+
+
+class NumpyFlatIndex:
+    """
+    Exact L2 index over a contiguous float32 matrix, used for partitions when FAISS is not installed.
+    Mirrors the parts of faiss.IndexIDMap the vector store uses (d, ntotal, add_with_ids, search),
+    so partitions are interchangeable. Searches are one matrix product plus an argpartition top-k.
+    """
+
+    def __init__(self, dimension: int):
+        self.d = dimension
+        self.ntotal = 0
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32) # Squared L2 norms of the rows
+        self._ids = np.empty(0, dtype=np.int64)
+
+    def add_with_ids(self, vectors, ids):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.d)
+        ids = np.asarray(ids, dtype=np.int64)
+        needed = self.ntotal + len(vectors)
+        if needed > len(self._vectors) or not self._vectors.flags.writeable:
+            # Grow geometrically so repeated adds stay amortised O(n); also copies memory-mapped rows into RAM
+            capacity = max(needed, 2 * len(self._vectors), 256)
+            grown_vectors = np.empty((capacity, self.d), dtype=np.float32)
+            grown_norms = np.empty(capacity, dtype=np.float32)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_vectors[:self.ntotal] = self._vectors[:self.ntotal]
+            grown_norms[:self.ntotal] = self._norms[:self.ntotal]
+            grown_ids[:self.ntotal] = self._ids[:self.ntotal]
+            self._vectors, self._norms, self._ids = grown_vectors, grown_norms, grown_ids
+        self._vectors[self.ntotal:needed] = vectors
+        self._norms[self.ntotal:needed] = np.einsum("ij,ij->i", vectors, vectors)
+        self._ids[self.ntotal:needed] = ids
+        self.ntotal = needed
+
+    def search(self, queries, k: int):
+        """Returns (squared L2 distances, ids), each of shape (n_queries, k), padded with inf / -1 like FAISS."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.d)
+        distances_out = np.full((len(queries), k), np.inf, dtype=np.float32)
+        ids_out = np.full((len(queries), k), -1, dtype=np.int64)
+        k_found = min(k, self.ntotal)
+        if k_found == 0:
+            return distances_out, ids_out
+        vectors = self._vectors[:self.ntotal]
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, for all queries at once
+        distances = self._norms[:self.ntotal][None, :] - 2.0 * (queries @ vectors.T)
+        distances += np.einsum("ij,ij->i", queries, queries)[:, None]
+        if k_found < self.ntotal:
+            candidates = np.argpartition(distances, k_found - 1, axis=1)[:, :k_found]
+        else:
+            candidates = np.broadcast_to(np.arange(self.ntotal), (len(queries), self.ntotal))
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        top = np.take_along_axis(candidates, order, axis=1)
+        distances_out[:, :k_found] = np.take_along_axis(candidate_distances, order, axis=1)
+        ids_out[:, :k_found] = self._ids[:self.ntotal][top]
+        return distances_out, ids_out
+
+    def vectors(self):
+        """Returns (ids, vectors) of all rows."""
+        return self._ids[:self.ntotal], self._vectors[:self.ntotal]
+
+    def write(self, path: str):
+        """Saves ids then vectors as two consecutive .npy arrays in one file."""
+        with open(path, "wb") as f:
+            np.save(f, self._ids[:self.ntotal])
+            np.save(f, self._vectors[:self.ntotal])
+
+    @classmethod
+    def read(cls, path: str, use_mmap: bool = True):
+        with open(path, "rb") as f:
+            ids = np.load(f)
+            if use_mmap and len(ids):
+                version = np.lib.format.read_magic(f)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+                shape, _, dtype = read_header(f)
+                vectors = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape)
+            else:
+                vectors = np.load(f)
+        index = cls(vectors.shape[1])
+        index._ids, index._vectors, index.ntotal = ids, vectors, len(ids)
+        index._norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32) if len(ids) else np.empty(0, dtype=np.float32)
+        return index
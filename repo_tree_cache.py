@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from config import (
+    REPO_BROWSER_TREE_CACHE_MAX_REPOS,
+    REPO_BROWSER_HEAD_CHECK_TTL_SECONDS,
+    REPO_BROWSER_PREFETCH_MAX_DIRS,
+)
+from github_service import fetch_repo_head_sha, fetch_repo_tree, fetch_repo_contents_list, list_tree_directory
+from github_response_cache import token_identity
+
+
+class RepoTreeCache:
+    """
+    In-memory, per-repository tree cache for the repo browser, keyed by head commit SHA.
+    The first visit fetches the whole recursive tree; later directory clicks are answered from memory.
+    If GitHub truncates the tree, directories are listed through the Contents API instead, and the
+    listings of the visited directory's children and siblings are prefetched in the background.
+    """
+
+    def __init__(self, max_repos: int = REPO_BROWSER_TREE_CACHE_MAX_REPOS, head_check_ttl: float = REPO_BROWSER_HEAD_CHECK_TTL_SECONDS):
+        self.max_repos = max_repos
+        self.head_check_ttl = head_check_ttl
+        self._entries = OrderedDict()
+        self._refresh_locks = {}
+        self._prefetch_tasks = set()
+
+    async def _get_entry(self, token: str, owner: str, repo_name: str):
+        key = (token_identity(token), owner.lower(), repo_name.lower())
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry["checked_at"] <= self.head_check_ttl:
+            self._entries.move_to_end(key)
+            return {"error": None, "data": entry}
+
+        async with self._refresh_locks.setdefault(key, asyncio.Lock()):
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["checked_at"] <= self.head_check_ttl:
+                return {"error": None, "data": entry}
+
+            head_result = await fetch_repo_head_sha(token, owner, repo_name)
+            if head_result["error"]:
+                if entry is not None:
+                    print(f"Could not re-check head of {owner}/{repo_name} ({head_result['error']}). Serving cached tree.")
+                    return {"error": None, "data": entry}
+                return {"error": head_result["error"], "data": None}
+            commit_sha = head_result["data"]
+
+            if entry is not None and entry["commit_sha"] == commit_sha:
+                entry["checked_at"] = time.monotonic()
+                self._entries.move_to_end(key)
+                return {"error": None, "data": entry}
+
+            tree_items, truncated = [], False
+            if commit_sha:
+                tree_result = await fetch_repo_tree(token, owner, repo_name, tree_ref=commit_sha)
+                if tree_result["error"]:
+                    return {"error": tree_result["error"], "data": None}
+                tree_items, truncated = tree_result["data"], tree_result["truncated"]
+
+            entry = {
+                "commit_sha": commit_sha,
+                "tree": None if truncated else tree_items,
+                "dir_listings": {}, # Only used for truncated trees
+                "prefetching": {}, # path -> in-flight prefetch task
+                "checked_at": time.monotonic(),
+            }
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_repos:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._refresh_locks.pop(evicted_key, None)
+            print(f"Cached tree for {owner}/{repo_name} at {commit_sha} ({len(tree_items)} entries{', truncated' if truncated else ''}).")
+            return {"error": None, "data": entry}
+
+    async def get_commit_sha(self, token: str, owner: str, repo_name: str):
+        """Returns {"error", "data"} with the commit SHA the cached tree describes (None for an empty repository)."""
+        entry_result = await self._get_entry(token, owner, repo_name)
+        if entry_result["error"]:
+            return entry_result
+        return {"error": None, "data": entry_result["data"]["commit_sha"]}
+
+    async def get_directory_listing(self, token: str, owner: str, repo_name: str, path: str = ""):
+        """Returns {"error", "data"} with Contents-API-shaped items for `path`, dirs first."""
+        entry_result = await self._get_entry(token, owner, repo_name)
+        if entry_result["error"]:
+            return entry_result
+        entry = entry_result["data"]
+        if not entry["commit_sha"]:
+            return {"error": None, "data": []} # Empty repository
+        path = path.strip("/")
+        if entry["tree"] is not None:
+            return {"error": None, "data": list_tree_directory(entry["tree"], path)}
+
+        if path in entry["prefetching"]:
+            await asyncio.shield(entry["prefetching"][path])
+        listing = entry["dir_listings"].get(path)
+        if listing is None:
+            result = await fetch_repo_contents_list(token, owner, repo_name, path, ref=entry["commit_sha"])
+            if result["error"]:
+                return result
+            listing = entry["dir_listings"][path] = result["data"]
+        self._schedule_prefetch(token, owner, repo_name, entry, path, listing)
+        return {"error": None, "data": listing}
+
+    def _schedule_prefetch(self, token: str, owner: str, repo_name: str, entry: dict, path: str, listing: list):
+        parent_path = os.path.dirname(path)
+        candidate_paths = [item["path"] for item in listing if item.get("type") == "dir"]
+        parent_listing = entry["dir_listings"].get(parent_path) if path else None
+        if parent_listing:
+            candidate_paths += [item["path"] for item in parent_listing if item.get("type") == "dir" and item["path"] != path]
+        to_prefetch = [
+            p for p in candidate_paths if p not in entry["dir_listings"] and p not in entry["prefetching"]
+        ][:REPO_BROWSER_PREFETCH_MAX_DIRS]
+        for prefetch_path in to_prefetch:
+            task = asyncio.create_task(self._prefetch_directory(token, owner, repo_name, entry, prefetch_path))
+            entry["prefetching"][prefetch_path] = task
+            self._prefetch_tasks.add(task) # Keep a reference so the task isn't garbage collected
+            task.add_done_callback(self._prefetch_tasks.discard)
+
+    async def _prefetch_directory(self, token: str, owner: str, repo_name: str, entry: dict, path: str):
+        try:
+            result = await fetch_repo_contents_list(token, owner, repo_name, path, ref=entry["commit_sha"])
+            if not result["error"]:
+                entry["dir_listings"][path] = result["data"]
+        finally:
+            entry["prefetching"].pop(path, None)
+
+
+repo_tree_cache = RepoTreeCache()
@@ -14,7 +14,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     function addLogEntry(message, type = 'info', repoName = null) {
         const entry = document.createElement('div');
-        entry.className = `flex items-center space-x-3 py-1 text-sm ${type === 'error' ? 'text-red-700' : type === 'success' ? 'text-green-700' : 'text-slate-700'}`;
+        entry.className = `flex items-center space-x-3 py-1 text-sm ${type === 'error' ? 'text-red-700' : (type === 'success' || type === 'cache_hit') ? 'text-green-700' : 'text-slate-700'}`;
         
         let iconSvg = '';
         // Use Heroicons or similar for icons
@@ -27,6 +27,11 @@ document.addEventListener('DOMContentLoaded', function () {
              iconSvg = `<svg class="h-5 w-5 text-green-500 flex-shrink-0" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
                       <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.857-9.809a.75.75 0 00-1.214-.882l-3.483 4.79-1.88-1.88a.75.75 0 10-1.06 1.061l2.5 2.5a.75.75 0 001.06 0l4-5.5z" clip-rule="evenodd" />
                     </svg>`;
+        } else if (type === 'cache_hit') {
+             // Unchanged since the last run: served from the stored CV entry
+             iconSvg = `<svg class="h-5 w-5 text-green-500 flex-shrink-0" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke-width="1.5" stroke="currentColor">
+                        <path stroke-linecap="round" stroke-linejoin="round" d="M16.023 9.348h4.992v-.001M2.985 19.644v-4.992m0 0h4.992m-4.993 0l3.181 3.183a8.25 8.25 0 0013.803-3.7M4.031 9.865a8.25 8.25 0 0113.803-3.7l3.181 3.182m0-4.991v4.99" />
+                    </svg>`;
         } else if (type === 'error') {
             iconSvg = `<svg class="h-5 w-5 text-red-500 flex-shrink-0" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
                       <path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm-1.293-8.707a1 1 0 011.414-1.414L10 8.586l1.293-1.293a1 1 0 111.414 1.414L11.414 10l1.293 1.293a1 1 0 01-1.414 1.414L10 11.414l-1.293 1.293a1 1 0 01-1.414-1.414L8.586 10 7.293 8.707z" clip-rule="evenodd" />
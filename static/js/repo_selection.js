@@ -8,6 +8,9 @@ document.addEventListener('DOMContentLoaded', function () {
     const selectedCountSpan = document.getElementById('selectedCount');
     const selectAllCheckbox = document.getElementById('selectAllCheckbox');
     const repoCheckboxes = document.querySelectorAll('input[name="selected_repos"]');
+    const repoFilterInput = document.getElementById('repoFilterInput');
+    const visibleRepoCountSpan = document.getElementById('visibleRepoCount');
+    const repoCards = document.querySelectorAll('[data-repo-card]');
     
     // Use data attribute from button for max count
     const maxManualSelectAttr = processSelectedButton.dataset.maxManualSelect;
@@ -47,11 +50,29 @@ document.addEventListener('DOMContentLoaded', function () {
         checkbox.addEventListener('change', updateSelectedCountAndButton);
     });
 
-    // Add event listener for Select All checkbox
+    // Filter the (full) repository list client-side; checked repos stay selected while hidden
+    if (repoFilterInput) {
+        repoFilterInput.addEventListener('input', function() {
+            const terms = repoFilterInput.value.toLowerCase().split(/\s+/).filter(Boolean);
+            let visibleCount = 0;
+            repoCards.forEach(card => {
+                const filterText = card.dataset.filterText || '';
+                const visible = terms.every(term => filterText.includes(term));
+                card.classList.toggle('hidden', !visible);
+                if (visible) visibleCount++;
+            });
+            if (visibleRepoCountSpan) visibleRepoCountSpan.textContent = visibleCount;
+            if (selectAllCheckbox) selectAllCheckbox.checked = false;
+        });
+    }
+
+    // Add event listener for Select All checkbox (applies to the repositories the filter leaves visible)
     if (selectAllCheckbox) {
         selectAllCheckbox.addEventListener('change', function() {
-            repoCheckboxes.forEach(checkbox => {
-                checkbox.checked = selectAllCheckbox.checked;
+            repoCards.forEach(card => {
+                if (card.classList.contains('hidden')) return;
+                const checkbox = card.querySelector('input[name="selected_repos"]');
+                if (checkbox) checkbox.checked = selectAllCheckbox.checked;
             });
             updateSelectedCountAndButton();
         });
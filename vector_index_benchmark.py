@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Vector Index Recall/Latency Report
+
+Measures recall@k and per-query latency of the flat, HNSW and IVF-PQ index structures
+(as built by vector_store_service.build_index) on our own embeddings, so VECTOR_INDEX_MODE
+and VECTOR_INDEX_ANN_THRESHOLD can be chosen from data rather than guessed.
+A second table compares the vector storage modes (VECTOR_STORAGE_MODE) on a flat index,
+with and without exact rerank, including their memory footprint: the rerank copies are as large as
+float32 storage and are memory-mapped only once a store is saved, so before that lossy storage + rerank
+needs more heap than plain float32.
+
+Embeddings are taken from the saved vector stores (VECTOR_STORE_DIR) and/or the
+embedding cache (EMBEDDING_CACHE_PATH). A held-out sample of them is used as queries; ground
+truth comes from an exact flat search over the remaining vectors.
+
+Usage:
+  python vector_index_benchmark.py
+  python vector_index_benchmark.py --source cache --queries 500 -k 10
+  python vector_index_benchmark.py --ef-search 16 32 64 128 --nprobe 4 8 16 32
+  python vector_index_benchmark.py --storage float32 int8 pq
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import vector_store_service
+from vector_store_service import faiss, build_index, index_vectors, estimate_index_bytes, storage_mode_of
+from config import DEFAULT_EMBEDDING_DIMENSION, EMBEDDING_CACHE_PATH, VECTOR_STORE_DIR
+
+
+def load_store_vectors(dimension: int) -> np.ndarray:
+    parts = []
+    namespaces = os.listdir(VECTOR_STORE_DIR) if os.path.isdir(VECTOR_STORE_DIR) else []
+    for namespace in namespaces:
+        store = vector_store_service.load_vector_store(dimension=dimension, directory=os.path.join(VECTOR_STORE_DIR, namespace))
+        parts += [index_vectors(index)[1] for index in store.partitions.values() if index.ntotal]
+    return np.vstack(parts).astype('float32') if parts else np.empty((0, dimension), dtype='float32')
+
+
+def load_cached_vectors(dimension: int) -> np.ndarray:
+    if not os.path.exists(EMBEDDING_CACHE_PATH):
+        return np.empty((0, dimension), dtype='float32')
+    conn = sqlite3.connect(EMBEDDING_CACHE_PATH)
+    try:
+        rows = conn.execute("SELECT dtype, vector FROM embeddings").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    vectors = [np.frombuffer(vector, dtype=dtype).astype(np.float32) for dtype, vector in rows]
+    vectors = [vector for vector in vectors if len(vector) == dimension] # Other embedding models
+    return np.vstack(vectors) if vectors else np.empty((0, dimension), dtype='float32')
+
+
+def time_queries(index, queries: np.ndarray, k: int):
+    """Searches one query at a time (as the app does) and returns (result ids, latencies in ms)."""
+    result_ids = np.empty((len(queries), k), dtype='int64')
+    latencies_ms = np.empty(len(queries))
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies_ms[i] = (time.perf_counter() - started) * 1000
+        result_ids[i] = ids[0]
+    return result_ids, latencies_ms
+
+
+def recall_at_k(result_ids: np.ndarray, truth_ids: np.ndarray) -> float:
+    hits = sum(len(set(r[r >= 0]) & set(t)) for r, t in zip(result_ids, truth_ids))
+    return hits / truth_ids.size
+
+
+def report_row(label: str, build_s: float, result_ids, latencies_ms, truth_ids):
+    print(f"{label:<24} {build_s:>9.2f} {recall_at_k(result_ids, truth_ids):>10.3f} "
+          f"{np.percentile(latencies_ms, 50):>9.3f} {np.percentile(latencies_ms, 95):>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall-vs-latency report for the vector index structures.")
+    parser.add_argument("--source", choices=["auto", "store", "cache"], default="auto", help="Where to read embeddings from.")
+    parser.add_argument("--dimension", type=int, default=DEFAULT_EMBEDDING_DIMENSION)
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out vectors used as queries.")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query (recall@k).")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128], help="HNSW efSearch values to sweep.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32], help="IVF nprobe values to sweep.")
+    parser.add_argument("--storage", nargs="+", default=["float32", "float16", "int8", "pq"], help="Vector storage modes to compare.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not faiss:
+        print("FAISS is not installed; nothing to benchmark.")
+        sys.exit(1)
+
+    sources = []
+    if args.source in ("auto", "store"):
+        sources.append(load_store_vectors(args.dimension))
+    if args.source in ("auto", "cache"):
+        sources.append(load_cached_vectors(args.dimension))
+    vectors = np.vstack(sources) if sources else np.empty((0, args.dimension), dtype='float32')
+    vectors = np.unique(vectors, axis=0) if len(vectors) else vectors
+
+    if len(vectors) <= args.queries + args.k:
+        print(f"Only {len(vectors)} embeddings found; generate some CVs first so there is data to benchmark.")
+        sys.exit(1)
+
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[order[:args.queries]])
+    corpus = np.ascontiguousarray(vectors[order[args.queries:]])
+    ids = np.arange(len(corpus), dtype='int64')
+    k = min(args.k, len(corpus))
+
+    print(f"Corpus: {len(corpus)} vectors (dim {args.dimension}), {len(queries)} queries, k={k}\n")
+    print(f"{'index':<24} {'build (s)':>9} {'recall@k':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+
+    started = time.perf_counter()
+    flat = build_index(corpus, ids, "flat", args.dimension, storage="float32")
+    flat_build_s = time.perf_counter() - started
+    truth_ids, flat_latencies = time_queries(flat, queries, k)
+    report_row("flat", flat_build_s, truth_ids, flat_latencies, truth_ids)
+
+    started = time.perf_counter()
+    hnsw = build_index(corpus, ids, "hnsw", args.dimension, storage="float32", exact_rerank=False)
+    hnsw_build_s = time.perf_counter() - started
+    for ef_search in args.ef_search:
+        faiss.downcast_index(hnsw.index).hnsw.efSearch = max(ef_search, k)
+        result_ids, latencies = time_queries(hnsw, queries, k)
+        report_row(f"hnsw efSearch={ef_search}", hnsw_build_s, result_ids, latencies, truth_ids)
+
+    started = time.perf_counter()
+    ivfpq = build_index(corpus, ids, "ivfpq", args.dimension, exact_rerank=False)
+    ivfpq_build_s = time.perf_counter() - started
+    ivf = faiss.downcast_index(ivfpq.index)
+    if len(corpus) < vector_store_service.ivfpq_min_training_vectors(len(corpus)):
+        print(f"(IVF-PQ trained on only {len(corpus)} vectors; the store would stay flat at this size)")
+    for nprobe in args.nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        result_ids, latencies = time_queries(ivfpq, queries, k)
+        report_row(f"ivfpq nprobe={ivf.nprobe}", ivfpq_build_s, result_ids, latencies, truth_ids)
+
+    print(f"\nStorage modes (flat structure; MB for {len(corpus)} vectors)")
+    print(f"{'storage':<24} {'search MB':>9} {'rerank MB':>10} {'unsaved MB':>10} {'recall@k':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for storage in args.storage:
+        for exact_rerank in ([False] if storage == "float32" else [False, True]):
+            index = build_index(corpus, ids, "flat", args.dimension, storage=storage, exact_rerank=exact_rerank)
+            sizes = estimate_index_bytes(index)
+            result_ids, latencies = time_queries(index, queries, k)
+            label = storage_mode_of(index) + (" + rerank" if exact_rerank else "")
+            if storage_mode_of(index) != storage:
+                label += f" (asked {storage})"
+            print(f"{label:<24} {sizes['search_bytes'] / 1e6:>9.2f} {sizes['rerank_bytes'] / 1e6:>10.2f} {(sizes['search_bytes'] + sizes['rerank_bytes']) / 1e6:>10.2f} "
+                  f"{recall_at_k(result_ids, truth_ids):>9.3f} {np.percentile(latencies, 50):>9.3f} {np.percentile(latencies, 95):>9.3f}")
+    print("search MB: codes, graph links and IDs read by every search. rerank MB: full-precision copies for the rerank.\n"
+          "Both are memory-mapped once the store is saved; unsaved MB is the heap use of a partition changed since the last save.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from chunk_table import ChunkTable, SOURCE_ARENA, NO_REPO
+from numpy_vector_index import NumpyFlatIndex
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# IO_FLAG_MMAP only maps IVF inverted lists; IO_FLAG_MMAP_IFC (faiss >= 1.8) maps flat/SQ/PQ codes, HNSW graphs,
+# refine vectors and IVF lists in place. Older faiss reads partitions fully into RAM.
+# Mapped arrays are read-only views: adding to one aborts the process, so writers go through `writable()`.
+_FAISS_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", None) if faiss else None
+FAISS_MMAP_SUPPORTED = _FAISS_MMAP_FLAG is not None
+
+# On-disk layout of one store directory:
+#   manifest.json            - committed state (sizes, partition files, repo names); replaced atomically
+#   chunks-<gen>.dat         - chunk texts, UTF-8, append-only
+#   chunks-<gen>.idx         - fixed-size CHUNK_RECORD_DTYPE records, append-only; length -1 marks a deletion
+#   partitions/<key>-<n>.faiss - one FAISS index per repository, written to a new name on every save
+#                               (.npy instead when FAISS is not installed; see numpy_vector_index)
+# Bytes past the sizes recorded in the manifest (from an interrupted save) are ignored and truncated.
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+CHUNK_RECORD_DTYPE = np.dtype([("doc_id", "<i8"), ("offset", "<i8"), ("length", "<i4"), ("repo", "<i4")])
+
+
+def _fsync_dir(directory: str):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_json_atomic(path: str, data: dict):
+    """Writes JSON to a temp file, fsyncs it and renames it over `path`."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def _partition_file_key(repo_full_name: str) -> str:
+    return hashlib.sha1(repo_full_name.encode("utf-8")).hexdigest()[:16]
+
+
+class PartitionMap(MutableMapping):
+    """
+    repo_full_name -> FAISS index. Saved partitions are read on first access, memory-mapped when
+    `use_mmap` is set (and the installed faiss supports it); `writable()` must be used before modifying
+    a partition in place. Lazy reads are serialized by a small mutex, so concurrent readers (which only
+    hold the store's shared lock) never change the loaded set at the same time or read one partition twice.
+    """
+
+    def __init__(self, directory: str = None, persisted: dict = None, use_mmap: bool = True):
+        self._directory = directory
+        self._persisted = dict(persisted or {}) # repo -> {"file", "ntotal"} as committed in the manifest
+        self._loaded = {}
+        self._mmapped = set()
+        self._dirty = set()
+        self._removed = set() # persisted repos dropped since the last save
+        self._use_mmap = use_mmap
+        self._load_lock = threading.Lock()
+
+    def _read(self, repo_full_name: str, use_mmap: bool):
+        path = os.path.join(self._directory, self._persisted[repo_full_name]["file"])
+        if path.endswith(".npy"):
+            index = NumpyFlatIndex.read(path, use_mmap=use_mmap)
+        else:
+            use_mmap = use_mmap and _FAISS_MMAP_FLAG is not None
+            index = faiss.read_index(path, _FAISS_MMAP_FLAG) if use_mmap else faiss.read_index(path)
+        if use_mmap:
+            self._mmapped.add(repo_full_name)
+        else:
+            self._mmapped.discard(repo_full_name)
+        self._loaded[repo_full_name] = index
+        return index
+
+    def __getitem__(self, repo_full_name):
+        index = self._loaded.get(repo_full_name)
+        if index is not None:
+            return index
+        if repo_full_name in self._persisted and repo_full_name not in self._removed:
+            with self._load_lock:
+                index = self._loaded.get(repo_full_name) # Another reader may have loaded it meanwhile
+                if index is None:
+                    index = self._read(repo_full_name, self._use_mmap)
+            return index
+        raise KeyError(repo_full_name)
+
+    def writable(self, repo_full_name):
+        """Returns the partition loaded fully into memory and marks it for saving."""
+        index = self[repo_full_name]
+        if repo_full_name in self._mmapped:
+            # Memory-mapped codes, graphs and lists are read-only; copy the partition into memory before changing it
+            index = self._read(repo_full_name, use_mmap=False)
+        self._dirty.add(repo_full_name)
+        return index
+
+    def __setitem__(self, repo_full_name, index):
+        self._loaded[repo_full_name] = index
+        self._mmapped.discard(repo_full_name)
+        self._removed.discard(repo_full_name)
+        self._dirty.add(repo_full_name)
+
+    def __delitem__(self, repo_full_name):
+        if repo_full_name not in self:
+            raise KeyError(repo_full_name)
+        self._loaded.pop(repo_full_name, None)
+        self._mmapped.discard(repo_full_name)
+        self._dirty.discard(repo_full_name)
+        if repo_full_name in self._persisted:
+            self._removed.add(repo_full_name)
+
+    def __contains__(self, repo_full_name):
+        return repo_full_name in self._loaded or (repo_full_name in self._persisted and repo_full_name not in self._removed)
+
+    def loaded_items(self):
+        """Snapshot of the (repo, index) pairs currently in memory; nothing is read from disk."""
+        with self._load_lock:
+            return list(self._loaded.items())
+
+    def __iter__(self):
+        with self._load_lock:
+            loaded = list(self._loaded)
+        yield from loaded
+        yield from [repo for repo in self._persisted if repo not in loaded and repo not in self._removed]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def vector_count(self, repo_full_name):
+        """Number of vectors in a partition, without loading it if it is still on disk."""
+        index = self._loaded.get(repo_full_name)
+        if index is not None:
+            return index.ntotal
+        return self._persisted[repo_full_name]["ntotal"] if repo_full_name in self else 0
+
+    def clear(self):
+        self._removed.update(self._persisted)
+        self._loaded = {}
+        self._mmapped = set()
+        self._dirty = set()
+
+    @property
+    def dirty(self):
+        return bool(self._dirty or self._removed)
+
+
+def _read_manifest(directory: str):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _open_text_mmap(path: str, size: int):
+    if size == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+
+def _load_chunk_table(directory: str, manifest: dict) -> ChunkTable:
+    chunks = manifest["chunks"]
+    records = np.fromfile(os.path.join(directory, chunks["idx_file"]), dtype=CHUNK_RECORD_DTYPE, count=chunks["records"])
+    doc_ids = np.zeros(0, dtype=np.int64)
+    latest = records
+    if len(records):
+        # The last record for a doc id wins; deletion records (length -1) drop it
+        reversed_ids = records["doc_id"][::-1]
+        unique_ids, reversed_positions = np.unique(reversed_ids, return_index=True)
+        latest = records[len(records) - 1 - reversed_positions]
+        live = latest["length"] >= 0
+        doc_ids, latest = unique_ids[live], latest[live]
+    disk_text = _open_text_mmap(os.path.join(directory, chunks["dat_file"]), chunks["data_bytes"])
+    return ChunkTable.from_saved(doc_ids, latest["offset"], latest["length"], latest["repo"], manifest["repos"], disk_text, manifest["next_id"])
+
+
+def load_store_state(directory: str, use_mmap: bool = True):
+    """
+    Returns (manifest, chunk_table, partitions) for a store directory, or None if nothing is saved there.
+    Only the manifest and the fixed-size chunk records are read; texts and indexes load on access.
+    """
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported vector store format version {manifest.get('version')} in {directory}")
+    chunk_table = _load_chunk_table(directory, manifest)
+    partitions = PartitionMap(directory, manifest["partitions"], use_mmap=use_mmap)
+    return manifest, chunk_table, partitions
+
+
+def _chunk_file_names(generation: int):
+    return f"chunks-{generation}.dat", f"chunks-{generation}.idx"
+
+
+def _append_chunks(directory: str, chunks_state: dict, chunk_table: ChunkTable, rewrite: bool):
+    """Appends changed chunks (or rewrites all live chunks) and returns the new chunk state for the manifest."""
+    live_ids = chunk_table.doc_ids()
+    if rewrite:
+        generation = chunks_state["generation"] + 1 if chunks_state else 0
+        dat_file, idx_file = _chunk_file_names(generation)
+        written_ids = live_ids
+        deletions = []
+        data_bytes, record_count, mode = 0, 0, "wb"
+    else:
+        generation = chunks_state["generation"]
+        dat_file, idx_file = chunks_state["dat_file"], chunks_state["idx_file"]
+        written_ids = live_ids[chunk_table._sources[live_ids] == SOURCE_ARENA]
+        deletions = chunk_table._deleted_from_disk
+        data_bytes, record_count, mode = chunks_state["data_bytes"], chunks_state["records"], "r+b"
+
+    dat_path, idx_path = os.path.join(directory, dat_file), os.path.join(directory, idx_file)
+    new_records = np.empty(len(written_ids) + len(deletions), dtype=CHUNK_RECORD_DTYPE)
+    with open(dat_path, mode) as dat:
+        dat.truncate(data_bytes) # Drop anything an interrupted save left past the committed size
+        dat.seek(data_bytes)
+        for i, doc_id in enumerate(written_ids):
+            encoded = chunk_table.text(int(doc_id)).encode("utf-8")
+            dat.write(encoded)
+            new_records[i] = (doc_id, data_bytes, len(encoded), chunk_table._repos[doc_id])
+            data_bytes += len(encoded)
+        dat.flush()
+        os.fsync(dat.fileno())
+    for i, doc_id in enumerate(deletions, start=len(written_ids)):
+        new_records[i] = (doc_id, 0, -1, NO_REPO)
+    with open(idx_path, mode) as idx:
+        idx.truncate(record_count * CHUNK_RECORD_DTYPE.itemsize)
+        idx.seek(record_count * CHUNK_RECORD_DTYPE.itemsize)
+        idx.write(new_records.tobytes())
+        idx.flush()
+        os.fsync(idx.fileno())
+
+    return {"generation": generation, "dat_file": dat_file, "idx_file": idx_file,
+            "data_bytes": data_bytes, "records": record_count + len(new_records), "live": len(chunk_table)}
+
+
+def save_store_state(directory: str, dimension: int, next_id: int, chunk_table: ChunkTable, partitions: PartitionMap, compact_dead_fraction: float = 0.5):
+    """
+    Persists a store's changes since its last save: new/removed chunks are appended, changed partitions
+    are written to new files, then the manifest is swapped in atomically and superseded files are removed.
+    Returns (chunk_table, partitions) re-opened on the saved state.
+    """
+    os.makedirs(os.path.join(directory, "partitions"), exist_ok=True)
+    manifest = _read_manifest(directory) or {}
+    chunks_state = manifest.get("chunks")
+    obsolete_files = []
+
+    rewrite = chunks_state is None or chunk_table._disk_cleared
+    if not rewrite and chunks_state["records"]:
+        arena_rows = int(np.count_nonzero(chunk_table._sources[chunk_table.doc_ids()] == SOURCE_ARENA))
+        records_after_append = chunks_state["records"] + arena_rows + len(chunk_table._deleted_from_disk)
+        rewrite = (records_after_append - len(chunk_table)) / records_after_append > compact_dead_fraction
+    if rewrite and chunks_state:
+        obsolete_files += [chunks_state["dat_file"], chunks_state["idx_file"]]
+    new_chunks_state = _append_chunks(directory, chunks_state, chunk_table, rewrite)
+
+    persisted_partitions = dict(manifest.get("partitions", {}))
+    for repo_full_name in partitions._removed:
+        entry = persisted_partitions.pop(repo_full_name, None)
+        if entry:
+            obsolete_files.append(entry["file"])
+    for repo_full_name in partitions._dirty:
+        index = partitions._loaded[repo_full_name]
+        previous = persisted_partitions.get(repo_full_name)
+        version = previous["version"] + 1 if previous else 0
+        extension = "npy" if isinstance(index, NumpyFlatIndex) else "faiss"
+        file_name = os.path.join("partitions", f"{_partition_file_key(repo_full_name)}-{version}.{extension}")
+        if isinstance(index, NumpyFlatIndex):
+            index.write(os.path.join(directory, file_name))
+        else:
+            faiss.write_index(index, os.path.join(directory, file_name))
+        with open(os.path.join(directory, file_name), "rb") as f:
+            os.fsync(f.fileno())
+        if previous:
+            obsolete_files.append(previous["file"])
+        persisted_partitions[repo_full_name] = {"file": file_name, "ntotal": int(index.ntotal), "version": version}
+
+    write_json_atomic(os.path.join(directory, MANIFEST_FILE), {
+        "version": MANIFEST_VERSION,
+        "dimension": dimension,
+        "next_id": next_id,
+        "repos": list(chunk_table._repo_names),
+        "chunks": new_chunks_state,
+        "partitions": persisted_partitions,
+    })
+    for file_name in obsolete_files:
+        try:
+            os.remove(os.path.join(directory, file_name))
+        except FileNotFoundError:
+            pass
+
+    # Re-open on the committed files. With mmap, partitions written just now are dropped from RAM and
+    # re-mapped on next use (their rerank vectors then stay on disk); otherwise loaded partitions stay loaded
+    _, reopened_table, reopened_partitions = load_store_state(directory, use_mmap=partitions._use_mmap)
+    keep = partitions._mmapped if partitions._use_mmap else set(partitions._loaded)
+    reopened_partitions._loaded = {repo: index for repo, index in partitions._loaded.items() if repo in keep and repo in persisted_partitions}
+    reopened_partitions._mmapped = partitions._mmapped & set(reopened_partitions._loaded)
+    return reopened_table, reopened_partitions
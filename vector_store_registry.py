@@ -0,0 +1,258 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import (
+    DEFAULT_EMBEDDING_DIMENSION,
+    VECTOR_STORE_NAMESPACE_IDLE_SECONDS,
+    VECTOR_STORE_MAX_NAMESPACES,
+    VECTOR_STORE_DIR,
+    VECTOR_STORE_SAVE_INTERVAL_SECONDS,
+)
+from vector_store_service import load_vector_store, save_vector_store
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. Waiting writers block new readers,
+    so a steady stream of searches cannot starve an upsert.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class VectorStoreRegistry:
+    """
+    Namespaced vector stores (one per user), each behind its own read/write lock.
+    Searches on a namespace run concurrently, writes to different namespaces run in parallel,
+    and namespaces that are idle (and not in use) are saved to disk and evicted.
+    Each namespace is persisted in its own directory under `base_dir` and reopened lazily on next use.
+    The store methods are synchronous; call them from asyncio.to_thread.
+    """
+
+    def __init__(self, dimension: int = DEFAULT_EMBEDDING_DIMENSION, idle_seconds: float = VECTOR_STORE_NAMESPACE_IDLE_SECONDS, max_namespaces: int = VECTOR_STORE_MAX_NAMESPACES, base_dir: str = VECTOR_STORE_DIR):
+        self.dimension = dimension
+        self.idle_seconds = idle_seconds
+        self.max_namespaces = max_namespaces
+        self.base_dir = base_dir
+        self._lock = threading.Lock() # Guards _namespaces only, never held while a store is loaded, saved or used
+        self._namespaces = OrderedDict() # namespace -> {"store", "lock", "in_use", "last_used", "loaded", "error"}
+        self._evicting = {} # namespace -> entry being saved after eviction
+
+    def _namespace_dir(self, namespace: str):
+        return os.path.join(self.base_dir, namespace) if self.base_dir else None
+
+    def _checkout(self, namespace: str):
+        with self._lock:
+            entry = self._namespaces.get(namespace) or self._evicting.get(namespace)
+            loading = entry is None
+            if loading:
+                # Placeholder so concurrent callers wait for this load instead of starting their own
+                entry = {"store": None, "lock": ReadWriteLock(), "in_use": 0, "last_used": time.monotonic(),
+                         "loaded": threading.Event(), "error": None}
+            self._namespaces[namespace] = entry
+            entry["in_use"] += 1
+            self._namespaces.move_to_end(namespace)
+            evicted = self._evict_locked()
+        self._save_evicted(evicted)
+        if loading:
+            self._load_entry(namespace, entry)
+        elif entry.get("loaded") is not None:
+            entry["loaded"].wait()
+        if entry.get("error") is not None:
+            self._checkin(entry)
+            raise entry["error"]
+        return entry
+
+    def _load_entry(self, namespace: str, entry):
+        # Runs outside the registry lock, so other namespaces are not blocked while this one is read from disk
+        try:
+            # Opening a saved store only reads its manifest and chunk records; the rest loads lazily
+            store = load_vector_store(dimension=self.dimension, directory=self._namespace_dir(namespace))
+        except Exception as e:
+            with self._lock:
+                entry["error"] = e
+                if self._namespaces.get(namespace) is entry:
+                    del self._namespaces[namespace]
+            entry["loaded"].set()
+            return
+        with self._lock:
+            entry["store"] = store
+        entry["loaded"].set()
+        print(f"Opened vector store namespace '{namespace}'.")
+
+    def _checkin(self, entry):
+        with self._lock:
+            entry["in_use"] -= 1
+            entry["last_used"] = time.monotonic()
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        idle = [ns for ns, entry in self._namespaces.items() if entry["in_use"] == 0 and now - entry["last_used"] > self.idle_seconds]
+        # Over the cap: also drop least recently used namespaces that nobody is using
+        for namespace in [ns for ns, entry in self._namespaces.items() if entry["in_use"] == 0 and ns not in idle]:
+            if len(self._namespaces) - len(idle) <= self.max_namespaces:
+                break
+            idle.append(namespace)
+        evicted = []
+        for namespace in idle:
+            entry = self._namespaces.pop(namespace)
+            self._evicting[namespace] = entry
+            evicted.append((namespace, entry))
+        if evicted:
+            print(f"Evicting {len(evicted)} idle vector store namespace(s).")
+        return evicted
+
+    def _save_evicted(self, evicted):
+        # Saved outside the registry lock; a namespace checked out again meanwhile reuses the same entry
+        for namespace, entry in evicted:
+            self._save_entry(namespace, entry)
+            with self._lock:
+                if self._evicting.get(namespace) is entry:
+                    del self._evicting[namespace]
+
+    def _save_entry(self, namespace: str, entry):
+        directory = self._namespace_dir(namespace)
+        if not directory or entry["store"] is None:
+            return
+        entry["lock"].acquire_write()
+        try:
+            if entry["store"].has_unsaved_changes():
+                save_vector_store(entry["store"], directory)
+        finally:
+            entry["lock"].release_write()
+
+    def flush_all(self):
+        """Saves every namespace with unsaved changes (called periodically and at shutdown)."""
+        with self._lock:
+            entries = list(self._namespaces.items()) + list(self._evicting.items())
+        for namespace, entry in entries:
+            self._save_entry(namespace, entry)
+
+    def evict_idle(self):
+        """Saves and evicts namespaces that are idle or over the cap (called periodically, not only on checkout)."""
+        with self._lock:
+            evicted = self._evict_locked()
+        self._save_evicted(evicted)
+
+    async def run_periodic_flush(self, interval_seconds: float = VECTOR_STORE_SAVE_INTERVAL_SECONDS):
+        """Background task: every `interval_seconds`, evicts idle namespaces and saves the changed ones."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.evict_idle)
+                await asyncio.to_thread(self.flush_all)
+            except Exception as e:
+                print(f"Error during periodic vector store flush: {e}")
+
+    @contextmanager
+    def read(self, namespace: str):
+        """Yields the namespace's store under a shared (read) lock."""
+        entry = self._checkout(namespace)
+        entry["lock"].acquire_read()
+        try:
+            yield entry["store"]
+        finally:
+            entry["lock"].release_read()
+            self._checkin(entry)
+
+    @contextmanager
+    def write(self, namespace: str):
+        """Yields the namespace's store under an exclusive (write) lock."""
+        entry = self._checkout(namespace)
+        entry["lock"].acquire_write()
+        try:
+            yield entry["store"]
+        finally:
+            entry["lock"].release_write()
+            self._checkin(entry)
+
+    def upsert_repo(self, namespace: str, repo_full_name: str, chunks: list[str], embeddings=None):
+        with self.write(namespace) as store:
+            return store.upsert_repo(repo_full_name, chunks, embeddings)
+
+    def delete_repo(self, namespace: str, repo_full_name: str):
+        with self.write(namespace) as store:
+            return store.delete_repo(repo_full_name)
+
+    def search_relevant_chunks(self, namespace: str, query_text: str, repo_full_name_filter: str, k: int = 5):
+        with self.read(namespace) as store:
+            return store.search_relevant_chunks(query_text, repo_full_name_filter, k)
+
+    def search_facets(self, namespace: str, queries_by_repo: dict[str, list[str]], max_chunks_per_repo: int = 8):
+        with self.read(namespace) as store:
+            return store.search_facets(queries_by_repo, max_chunks_per_repo)
+
+    def stats(self):
+        """Per-namespace memory stats of the stores currently held in memory."""
+        with self._lock:
+            entries = list(self._namespaces.items())
+        stats = {}
+        for namespace, entry in entries:
+            if entry["store"] is None:
+                continue # Still loading
+            entry["lock"].acquire_read()
+            try:
+                stats[namespace] = entry["store"].stats()
+            finally:
+                entry["lock"].release_read()
+        return stats
+
+    def readiness(self) -> dict:
+        """Cheap status for readiness probes: no store locks are taken and nothing is loaded."""
+        directory_ok = True
+        if self.base_dir:
+            try:
+                os.makedirs(self.base_dir, exist_ok=True)
+                directory_ok = os.access(self.base_dir, os.W_OK)
+            except OSError:
+                directory_ok = False
+        with self._lock:
+            loaded, evicting = len(self._namespaces), len(self._evicting)
+        return {"status": "ready" if directory_ok else "failed", "directory": self.base_dir, "directory_writable": directory_ok,
+                "loaded_namespaces": loaded, "saving_namespaces": evicting}
+
+    def drop(self, namespace: str):
+        """Saves and removes a namespace from memory immediately (no-op if it is unknown or in use)."""
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if entry is None or entry["in_use"]:
+                return
+            del self._namespaces[namespace]
+            self._evicting[namespace] = entry
+        self._save_evicted([(namespace, entry)])
+
+
+vector_store_registry = VectorStoreRegistry()
@@ -1,10 +1,23 @@
 import numpy as np
+import math
 import time
 import os 
-import json 
+import threading
 
 # Use the configured embedding dimension and service
-from config import DEFAULT_EMBEDDING_DIMENSION
+from config import (
+    DEFAULT_EMBEDDING_DIMENSION,
+    VECTOR_INDEX_MODE, VECTOR_INDEX_AUTO_ANN_MODE, VECTOR_INDEX_ANN_THRESHOLD,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    IVF_PQ_SUBQUANTIZERS, IVF_PQ_BITS, IVF_NPROBE, IVF_MIN_POINTS_PER_LIST,
+    VECTOR_STORE_MMAP_INDEXES, VECTOR_STORE_COMPACT_DEAD_FRACTION,
+    VECTOR_STORAGE_MODE, VECTOR_STORAGE_EXACT_RERANK, VECTOR_RERANK_CANDIDATE_FACTOR,
+    HYBRID_RETRIEVAL_ENABLED, HYBRID_CANDIDATES_PER_QUERY, HYBRID_RRF_K,
+)
+from vector_store_persistence import PartitionMap, load_store_state, save_store_state, FAISS_MMAP_SUPPORTED
+from chunk_table import ChunkTable
+from numpy_vector_index import NumpyFlatIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion
 from gemini_service import get_embeddings_batch # This now routes to local or API based on config
 
 # Attempt to import FAISS
@@ -13,197 +26,514 @@ try:
     print("FAISS library imported successfully.")
 except ImportError:
     faiss = None
-    print("FAISS library not found. Vector store functionality will be severely limited (basic keyword matching).")
+    print("FAISS library not found. Vector store will use exact NumPy search (flat, float32 only).")
+
+def _ivf_list_count(vector_count: int) -> int:
+    return max(16, int(math.sqrt(vector_count)))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count <= IVF_PQ_SUBQUANTIZERS that divides the dimension."""
+    m = min(IVF_PQ_SUBQUANTIZERS, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def ivfpq_min_training_vectors(vector_count: int) -> int:
+    """Training set size needed for both the coarse quantizer and the PQ codebooks."""
+    return max(_ivf_list_count(vector_count), 2 ** IVF_PQ_BITS) * IVF_MIN_POINTS_PER_LIST
+
+
+def resolve_index_mode(vector_count: int, mode: str = VECTOR_INDEX_MODE) -> str:
+    """Index structure a partition with `vector_count` vectors should use under `mode`."""
+    if mode == "auto":
+        if vector_count < VECTOR_INDEX_ANN_THRESHOLD:
+            return "flat"
+        mode = VECTOR_INDEX_AUTO_ANN_MODE
+    if mode == "ivfpq" and vector_count < ivfpq_min_training_vectors(vector_count):
+        return "flat" # Not enough vectors to train IVF-PQ yet
+    return mode
+
+
+def resolve_storage_mode(vector_count: int, storage: str = VECTOR_STORAGE_MODE) -> str:
+    """Vector encoding a partition with `vector_count` vectors can use; PQ needs enough vectors to train its codebooks."""
+    if storage == "pq" and vector_count < 2 ** IVF_PQ_BITS * IVF_MIN_POINTS_PER_LIST:
+        return "int8"
+    return storage
+
+
+# Rerank copies on the heap would cost more than float32 storage itself, so only keep them where they get mapped
+EXACT_RERANK_BY_DEFAULT = VECTOR_STORAGE_EXACT_RERANK and VECTOR_STORE_MMAP_INDEXES and FAISS_MMAP_SUPPORTED
+
+_SCALAR_QUANTIZER_TYPES = {"float16": "QT_fp16", "int8": "QT_8bit"}
+
+
+def _build_structure(mode: str, storage: str, dimension: int, vector_count: int):
+    if mode == "hnsw":
+        if storage in _SCALAR_QUANTIZER_TYPES:
+            structure = faiss.IndexHNSWSQ(dimension, getattr(faiss.ScalarQuantizer, _SCALAR_QUANTIZER_TYPES[storage]), HNSW_M)
+        elif storage == "pq":
+            structure = faiss.IndexHNSWPQ(dimension, _pq_subquantizers(dimension), HNSW_M)
+        else:
+            structure = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        structure.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        structure.hnsw.efSearch = HNSW_EF_SEARCH
+        return structure
+    if mode == "ivfpq":
+        quantizer = faiss.IndexFlatL2(dimension)
+        structure = faiss.IndexIVFPQ(quantizer, dimension, _ivf_list_count(vector_count), _pq_subquantizers(dimension), IVF_PQ_BITS)
+        structure.nprobe = IVF_NPROBE
+        return structure
+    if storage in _SCALAR_QUANTIZER_TYPES:
+        return faiss.IndexScalarQuantizer(dimension, getattr(faiss.ScalarQuantizer, _SCALAR_QUANTIZER_TYPES[storage]))
+    if storage == "pq":
+        return faiss.IndexPQ(dimension, _pq_subquantizers(dimension), IVF_PQ_BITS)
+    return faiss.IndexFlatL2(dimension)
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, mode: str, dimension: int, storage: str = None, exact_rerank: bool = EXACT_RERANK_BY_DEFAULT):
+    """
+    Builds an IndexIDMap of the given structure ('flat', 'hnsw' or 'ivfpq') over `vectors`,
+    training it first where the structure needs it.
+    `storage` selects how vectors are encoded ('float32', 'float16', 'int8' or 'pq'; IVF-PQ is always PQ).
+    For lossy encodings with `exact_rerank`, full-precision vectors are kept alongside (IndexRefineFlat)
+    and the top candidates are re-scored exactly. Those copies are float32-sized: once the store is saved they are
+    memory-mapped (clean file pages the kernel can drop), but until then they are on the heap, on top of the codes.
+    """
+    if not faiss:
+        index = NumpyFlatIndex(dimension)
+        if len(vectors):
+            index.add_with_ids(vectors, ids)
+        return index
+    storage = resolve_storage_mode(len(vectors), storage or VECTOR_STORAGE_MODE)
+    inner = _build_structure(mode, storage, dimension, len(vectors))
+    if exact_rerank and (storage != "float32" or mode == "ivfpq"):
+        inner = faiss.IndexRefineFlat(inner)
+        inner.k_factor = VECTOR_RERANK_CANDIDATE_FACTOR
+    if not inner.is_trained:
+        inner.train(vectors)
+    index = faiss.IndexIDMap(inner)
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def _unwrap_index(index):
+    """Returns (structure index, exact refine index or None) of a partition's IndexIDMap."""
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexRefine):
+        return faiss.downcast_index(inner.base_index), faiss.downcast_index(inner.refine_index)
+    return inner, None
+
+
+def index_vectors(index):
+    """Returns (ids, vectors) stored in a partition index; vectors are approximate for lossy storage without rerank."""
+    if isinstance(index, NumpyFlatIndex):
+        return index.vectors()
+    structure, refine = _unwrap_index(index)
+    source = refine if refine is not None else structure
+    if isinstance(source, faiss.IndexIVF):
+        source.make_direct_map()
+    ids = faiss.vector_to_array(index.id_map).astype('int64')
+    vectors = source.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype='float32')
+    return ids, vectors
+
+
+def estimate_index_bytes(index) -> dict:
+    """
+    Approximate size of a partition index: `search_bytes` (codes, graph links, ID map; touched by every search)
+    and `rerank_bytes` (full-precision vectors kept only for exact rerank; heap until saved, memory-mapped after).
+    """
+    if isinstance(index, NumpyFlatIndex):
+        return {"search_bytes": index.ntotal * (index.d * 4 + 4 + 8), "rerank_bytes": 0}
+    structure, refine = _unwrap_index(index)
+    ntotal = index.ntotal
+    id_map_bytes = ntotal * 8
+    if isinstance(structure, faiss.IndexHNSW):
+        storage = faiss.downcast_index(structure.storage)
+        link_bytes = ntotal * structure.hnsw.nb_neighbors(0) * 4 # Level-0 links dominate
+        search_bytes = storage.code_size * ntotal + link_bytes + id_map_bytes
+    elif isinstance(structure, faiss.IndexIVF):
+        search_bytes = (structure.code_size + 8) * ntotal + structure.nlist * structure.d * 4 + id_map_bytes
+    else:
+        search_bytes = structure.code_size * ntotal + id_map_bytes
+    rerank_bytes = refine.code_size * ntotal if refine is not None else 0
+    return {"search_bytes": search_bytes, "rerank_bytes": rerank_bytes}
+
+
+def storage_mode_of(index) -> str:
+    """Vector encoding of an existing partition index ('float32', 'float16', 'int8' or 'pq')."""
+    if isinstance(index, NumpyFlatIndex):
+        return "float32"
+    structure, _ = _unwrap_index(index)
+    if isinstance(structure, faiss.IndexHNSW):
+        structure = faiss.downcast_index(structure.storage)
+    if isinstance(structure, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(structure, faiss.IndexScalarQuantizer):
+        return "float16" if structure.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "float32"
+
+
+def index_mode_of(index) -> str:
+    """Structure of an existing partition index ('flat', 'hnsw' or 'ivfpq')."""
+    if isinstance(index, NumpyFlatIndex):
+        return "flat"
+    inner, _ = _unwrap_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
 
 class FAISSVectorStore:
+    """
+    Vector store partitioned by repository: each repo gets its own FAISS sub-index holding only its chunks.
+    A repo-filtered search scans just that repo's vectors, so its cost scales with the repo, not the store,
+    and it returns k results whenever the repo has at least k chunks.
+    Document IDs are global across partitions and index the columnar `chunk_table` (text + repo per chunk).
+    A store loaded from disk reads partitions and chunk texts lazily (see vector_store_persistence).
+    Each partition also has a BM25 index over its chunk texts, built from the chunk table on first use
+    and then kept up to date by add_documents; hybrid search fuses both rankings.
+    """
     def __init__(self, dimension=DEFAULT_EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.partitions = PartitionMap(use_mmap=VECTOR_STORE_MMAP_INDEXES) # repo_full_name -> faiss index (IndexIDMap over that repo's vectors)
+        self.chunk_table = ChunkTable() 
+        self.lexical_indexes = {} # repo_full_name -> BM25Index over that repo's chunks (not persisted)
+        self._lexical_build_lock = threading.Lock() # Searches hold only the shared lock, so first-use builds are serialized here
+        self.next_id = 0 
         if not faiss:
-            self.index = None
-            self.document_map = {} 
-            self.next_id = 0
-            print("FAISS not available. Using a simple list for documents (no actual vector search).")
+            print("FAISS not available. Partitions use exact NumPy search.")
+
+    def _maybe_upgrade_partition(self, repo_full_name: str):
+        """
+        Rebuilds a flat partition as an ANN index once it grows past the configured size, and re-encodes
+        a partition whose vector storage no longer matches the configured mode (e.g. int8 until PQ can train).
+        """
+        if not faiss:
+            return # ANN structures and quantized storage need FAISS
+        partition_index = self.partitions[repo_full_name]
+        current_mode = index_mode_of(partition_index)
+        target_mode = resolve_index_mode(partition_index.ntotal)
+        target_storage = resolve_storage_mode(partition_index.ntotal)
+        needs_ann = current_mode == "flat" and target_mode != "flat"
+        needs_reencode = current_mode != "ivfpq" and storage_mode_of(partition_index) != target_storage
+        if not needs_ann and not needs_reencode:
             return
+        target_mode = target_mode if needs_ann else current_mode
+        started = time.time()
+        ids, vectors = index_vectors(partition_index)
+        self.partitions[repo_full_name] = build_index(vectors, ids, target_mode, self.dimension)
+        print(f"Rebuilt partition '{repo_full_name}' as {target_mode}/{target_storage} ({len(ids)} vectors, {time.time() - started:.2f}s).")
 
-        self.dimension = dimension
-        self.index = faiss.IndexIDMap(faiss.IndexFlatL2(dimension))
-        self.document_map = {} 
-        self.next_id = 0 
+    def _lexical_index(self, repo_full_name: str) -> BM25Index:
+        """The repo's BM25 index, built from its chunk texts the first time it is needed."""
+        lexical_index = self.lexical_indexes.get(repo_full_name)
+        if lexical_index is not None:
+            return lexical_index
+        with self._lexical_build_lock:
+            lexical_index = self.lexical_indexes.get(repo_full_name) # Another search may have built it meanwhile
+            if lexical_index is None:
+                started = time.time()
+                doc_ids = self._repo_doc_ids(repo_full_name)
+                lexical_index = BM25Index()
+                lexical_index.add(doc_ids, (self.chunk_table.text(doc_id) for doc_id in doc_ids))
+                self.lexical_indexes[repo_full_name] = lexical_index
+                print(f"Built BM25 index for '{repo_full_name}' ({len(doc_ids)} chunks, {time.time() - started:.2f}s).")
+        return lexical_index
+
+    @property
+    def ntotal(self):
+        """Total number of vectors across all repository partitions."""
+        return sum(self.partitions.vector_count(repo_name) for repo_name in self.partitions)
+
+    def has_unsaved_changes(self):
+        return self.chunk_table.dirty or self.partitions.dirty
 
-    def add_documents(self, texts_with_repo_names: list[tuple[str, str]]):
+    def stats(self):
+        """Memory use of the chunk table and the partition indexes, including bytes per chunk."""
+        table_stats = self.chunk_table.stats()
+        # Snapshots: concurrent searches (also under the shared lock) may load partitions or build BM25 indexes
+        loaded_partitions = self.partitions.loaded_items()
+        with self._lexical_build_lock:
+            lexical_indexes = list(self.lexical_indexes.values())
+        index_sizes = [estimate_index_bytes(index) for _, index in loaded_partitions]
+        index_bytes = sum(size["search_bytes"] for size in index_sizes)
+        chunks = table_stats["chunks"]
+        return {
+            **table_stats,
+            "partitions": len(self.partitions),
+            "loaded_partitions": len(loaded_partitions),
+            "vectors": self.ntotal,
+            "storage_mode": VECTOR_STORAGE_MODE,
+            "index_bytes": index_bytes,
+            "rerank_vector_bytes": sum(size["rerank_bytes"] for size in index_sizes),
+            "lexical_indexes": len(lexical_indexes),
+            "lexical_index_bytes": sum(index.memory_bytes() for index in lexical_indexes),
+            "total_bytes_per_chunk": round((table_stats["resident_bytes"] + index_bytes) / chunks, 1) if chunks else 0.0,
+        }
+
+    def add_documents(self, texts_with_repo_names: list[tuple[str, str]], embeddings=None):
         """
         Adds documents (chunks) to the FAISS index.
         texts_with_repo_names: list of tuples, e.g., [("chunk1 text", "owner/repo1"), ...]
+        embeddings: optional precomputed vectors aligned with texts_with_repo_names (skips the embedding call).
+        Chunks whose embedding is None (failed) are skipped; the others are still added.
         """
-        if not self.index and faiss: 
-            print("FAISS index not initialized properly. Cannot add documents.")
+        if embeddings is not None and len(embeddings) != len(texts_with_repo_names):
+            print(f"Mismatch in number of precomputed embeddings ({len(embeddings)}) and texts ({len(texts_with_repo_names)}). Aborting add.")
             return False
-        
-        texts_to_embed = [text for text, repo_name in texts_with_repo_names if text and text.strip()]
-        repo_names_for_texts = [repo_name for text, repo_name in texts_with_repo_names if text and text.strip()]
+        valid_positions = [i for i, (text, repo_name) in enumerate(texts_with_repo_names) if text and text.strip()]
+        texts_to_embed = [texts_with_repo_names[i][0] for i in valid_positions]
+        repo_names_for_texts = [texts_with_repo_names[i][1] for i in valid_positions]
 
         if not texts_to_embed:
             print("No valid texts to embed.")
             return False
             
-        # get_embeddings_batch is synchronous (or uses synchronous local model)
-        # If performance is an issue, this part would need async embedding calls
-        embedding_results = get_embeddings_batch(texts_to_embed) 
+        if embeddings is not None:
+            embeddings_list = [embeddings[i] for i in valid_positions]
+        else:
+            # get_embeddings_batch is synchronous (or uses synchronous local model)
+            # If performance is an issue, this part would need async embedding calls
+            embedding_results = get_embeddings_batch(texts_to_embed) 
 
-        if embedding_results["error"] or not embedding_results.get("embeddings"):
-            print(f"Failed to generate embeddings for batch: {embedding_results['error']}")
-            return False
-        
-        embeddings_list = embedding_results["embeddings"]
+            if not embedding_results.get("embeddings"):
+                print(f"Failed to generate embeddings for batch: {embedding_results['error']}")
+                return False
+            if embedding_results["error"]:
+                print(f"Some embeddings failed; their chunks are skipped: {embedding_results['error']}")
+            
+            embeddings_list = embedding_results["embeddings"]
         
         if len(embeddings_list) != len(texts_to_embed):
             print(f"Mismatch in number of embeddings ({len(embeddings_list)}) and texts ({len(texts_to_embed)}). Aborting add.")
             return False
 
-        new_doc_ids_np = np.array([self.next_id + i for i in range(len(texts_to_embed))]).astype('int64')
-        
-        for i, text_chunk in enumerate(texts_to_embed):
-            current_id = self.next_id + i
-            self.document_map[current_id] = {"text": text_chunk, "repo_full_name": repo_names_for_texts[i]}
-        
-        self.next_id += len(texts_to_embed)
+        embedded_positions = [i for i, vector in enumerate(embeddings_list) if vector is not None]
+        if len(embedded_positions) != len(embeddings_list):
+            print(f"Skipping {len(embeddings_list) - len(embedded_positions)} chunks without embeddings.")
+            texts_to_embed = [texts_to_embed[i] for i in embedded_positions]
+            repo_names_for_texts = [repo_names_for_texts[i] for i in embedded_positions]
+            embeddings_list = [embeddings_list[i] for i in embedded_positions]
+
+        new_doc_ids_np = np.arange(self.next_id, self.next_id + len(texts_to_embed), dtype='int64')
 
-        if embeddings_list:
+        if len(embeddings_list):
             embeddings_np = np.array(embeddings_list).astype('float32')
             if embeddings_np.shape[1] != self.dimension:
                 print(f"ERROR: Embedding dimension mismatch! Expected {self.dimension}, got {embeddings_np.shape[1]}. Cannot add to FAISS.")
-                for i in range(len(texts_to_embed)):
-                    self.document_map.pop(self.next_id - len(texts_to_embed) + i, None)
-                self.next_id -= len(texts_to_embed)
                 return False
 
-            if faiss and self.index:
-                # faiss.add_with_ids is synchronous
-                self.index.add_with_ids(embeddings_np, new_doc_ids_np)
-                print(f"Added {len(embeddings_list)} new documents to FAISS index. Total docs in index: {self.index.ntotal}")
-            elif not faiss: 
-                print(f"FAISS not available. Stored {len(texts_to_embed)} document texts in map (no vector indexing).")
+            self.chunk_table.append(self.next_id, texts_to_embed, repo_names_for_texts)
+            self.next_id += len(texts_to_embed)
+
+            # Route each vector to its repository's partition (FAISS, or NumPy without it); adds are synchronous
+            repo_positions = {}
+            for position, repo_name in enumerate(repo_names_for_texts):
+                repo_positions.setdefault(repo_name, []).append(position)
+            for repo_name, positions in repo_positions.items():
+                if repo_name in self.lexical_indexes:
+                    self.lexical_indexes[repo_name].add(new_doc_ids_np[positions].tolist(), [texts_to_embed[p] for p in positions])
+                if repo_name in self.partitions:
+                    self.partitions.writable(repo_name).add_with_ids(embeddings_np[positions], new_doc_ids_np[positions])
+                    self._maybe_upgrade_partition(repo_name)
+                else:
+                    # Built from its first vectors so quantized encodings can be trained on them
+                    self.partitions[repo_name] = build_index(
+                        embeddings_np[positions], new_doc_ids_np[positions], resolve_index_mode(len(positions)), self.dimension
+                    )
+            print(f"Added {len(embeddings_list)} new documents across {len(repo_positions)} repo partition(s). Total docs in store: {self.ntotal}")
             return True
         return False
 
     def search_relevant_chunks(self, query_text: str, repo_full_name_filter: str, k: int = 5):
         """
         Searches for k most relevant chunks for a given query text,
-        filtered for a specific repository.
+        within a specific repository's partition.
         """
-        if not self.index and faiss:
-            print("FAISS index not initialized. Cannot search.")
-            return []
         if not query_text or not query_text.strip():
             return []
+        return self.search_facets({repo_full_name_filter: [query_text]}, k).get(repo_full_name_filter, [])
 
+    def search_facets(self, queries_by_repo: dict[str, list[str]], max_chunks_per_repo: int = 8, hybrid: bool = HYBRID_RETRIEVAL_ENABLED):
+        """
+        Multi-facet retrieval for one or many repositories.
+        queries_by_repo: {"owner/repo": ["overview query", "features query", ...], ...}
+        All queries are embedded in one batch, then each repo's partition is searched once with its query matrix.
+        With hybrid on, each facet's vector ranking is fused (RRF) with its BM25 ranking over the same partition,
+        so exact identifiers, library names and config keys are found even when embeddings miss them.
+        Per repo, results are merged round-robin across facets (best hit of every facet first), de-duplicated,
+        and capped at max_chunks_per_repo. Returns {"owner/repo": [chunk texts]}.
+        """
+        queries_by_repo = {repo: [q for q in queries if q and q.strip()] for repo, queries in queries_by_repo.items()}
+        searchable = {repo: queries for repo, queries in queries_by_repo.items() if queries and repo in self.partitions}
+        for repo in queries_by_repo:
+            if repo not in searchable:
+                print(f"No vectors stored for '{repo}'.")
+        results = {repo: [] for repo in queries_by_repo}
+        if not searchable:
+            return results
+
+        all_queries = [query for queries in searchable.values() for query in queries]
         # get_embeddings_batch is synchronous (or uses synchronous local model)
-        query_embedding_result = get_embeddings_batch([query_text]) 
-        if query_embedding_result["error"] or not query_embedding_result.get("embeddings"):
-            print(f"Failed to generate query embedding: {query_embedding_result['error']}")
-            return []
+        query_embedding_result = get_embeddings_batch(all_queries) 
+        if not query_embedding_result.get("embeddings") or all(vector is None for vector in query_embedding_result["embeddings"]):
+            print(f"Failed to generate query embeddings: {query_embedding_result['error']}")
+            return results
+        query_embeddings = query_embedding_result["embeddings"]
+        if query_embedding_result["error"]:
+            print(f"Some query embeddings failed; those facets are skipped: {query_embedding_result['error']}")
+        embedded_queries = iter(zip(all_queries, query_embeddings))
+        searchable = {repo: [query for query, vector in (next(embedded_queries) for _ in queries) if vector is not None] for repo, queries in searchable.items()}
+        query_embeddings = [vector for vector in query_embeddings if vector is not None]
 
-        query_vector = np.array(query_embedding_result["embeddings"]).astype('float32')
-        if query_vector.shape[1] != self.dimension:
-            print(f"ERROR: Query embedding dimension mismatch! Expected {self.dimension}, got {query_vector.shape[1]}.")
-            return []
-            
-        relevant_chunks_text = []
+        query_vectors = np.array(query_embeddings).astype('float32')
+        if query_vectors.shape != (len(query_embeddings), self.dimension):
+            print(f"ERROR: Query embeddings have shape {query_vectors.shape}, expected ({len(query_embeddings)}, {self.dimension}).")
+            return results
 
-        if faiss and self.index and self.index.ntotal > 0:
-            # faiss.search is synchronous
-            k_search = min(self.index.ntotal, k * 10 if self.index.ntotal > k*10 else self.index.ntotal)
-            distances, ids_from_faiss = self.index.search(query_vector, k_search)
-            
-            retrieved_count = 0
-            for i in range(ids_from_faiss.shape[1]): 
-                doc_id = ids_from_faiss[0, i]
-                if doc_id == -1 : continue 
-
-                if doc_id in self.document_map:
-                    doc_info = self.document_map[doc_id]
-                    if doc_info["repo_full_name"] == repo_full_name_filter:
-                        relevant_chunks_text.append(doc_info["text"])
-                        retrieved_count += 1
-                        if retrieved_count >= k:
-                            break
-        elif not faiss: 
-            print("FAISS not available. Performing basic keyword matching (very inefficient).")
-            query_terms = set(query_text.lower().split())
-            for doc_id_key, doc_info in self.document_map.items(): 
-                if doc_info["repo_full_name"] == repo_full_name_filter:
-                    doc_terms = set(doc_info["text"].lower().split())
-                    if query_terms.intersection(doc_terms): 
-                        relevant_chunks_text.append(doc_info["text"])
-                        if len(relevant_chunks_text) >= k:
-                            break
-                            
-        print(f"Found {len(relevant_chunks_text)} relevant chunks for query in '{repo_full_name_filter}'.")
-        return relevant_chunks_text
+        row = 0
+        for repo_name, queries in searchable.items():
+            repo_query_vectors = query_vectors[row:row + len(queries)]
+            row += len(queries)
+            if not queries:
+                continue
+            partition_index = self.partitions[repo_name]
+            # Each facet may return chunks another facet already found, so ask every facet for the full budget;
+            # fusion needs deeper rankings so a chunk ranked well by only one side can still surface
+            k_search = min(max(max_chunks_per_repo, HYBRID_CANDIDATES_PER_QUERY) if hybrid else max_chunks_per_repo, partition_index.ntotal)
+            if k_search <= 0:
+                continue
+            # Only this repo's vectors are scanned, once for all its facets; search is synchronous
+            _, ids_found = partition_index.search(repo_query_vectors, k_search)
+            if hybrid:
+                lexical_index = self._lexical_index(repo_name)
+                fused_rankings = [
+                    reciprocal_rank_fusion([facet_ids[facet_ids != -1].tolist(), lexical_index.search(query, k_search)], HYBRID_RRF_K)
+                    for facet_ids, query in zip(ids_found, queries)
+                ]
+                # Pad to a common depth so the rank-major merge below works on a rectangular array
+                depth = max(len(ranking) for ranking in fused_rankings)
+                ids_found = np.full((len(queries), depth), -1, dtype='int64')
+                for i, ranking in enumerate(fused_rankings):
+                    ids_found[i, :len(ranking)] = ranking
+            seen_ids = set()
+            for doc_id in ids_found.T.ravel(): # Rank-major order: rank 0 of every facet, then rank 1, ...
+                if doc_id == -1 or doc_id in seen_ids or doc_id not in self.chunk_table:
+                    continue
+                seen_ids.add(doc_id)
+                results[repo_name].append(self.chunk_table.text(int(doc_id)))
+                if len(results[repo_name]) >= max_chunks_per_repo:
+                    break
+            print(f"Found {len(results[repo_name])} relevant chunks for {len(queries)} queries in '{repo_name}'.")
+        return results
 
-    def reset_index(self):
-        """Resets the FAISS index and document map."""
-        # faiss.reset is synchronous
-        if faiss and self.index:
-            self.index.reset() 
-        self.document_map = {}
-        self.next_id = 0
-        print("Vector store index and document map have been reset.")
+    def _repo_doc_ids(self, repo_full_name: str) -> list[int]:
+        return self.chunk_table.doc_ids(repo_full_name).tolist()
 
+    def delete_repo(self, repo_full_name: str) -> int:
+        """
+        Removes every chunk of one repository from the index and the chunk table.
+        Other repositories' vectors are untouched; returns the number of chunks removed.
+        """
+        doc_ids = self._repo_doc_ids(repo_full_name)
+        # The partition holds only this repo's vectors, so dropping it removes them all at once
+        self.partitions.pop(repo_full_name, None)
+        self.lexical_indexes.pop(repo_full_name, None)
+        self.chunk_table.delete(doc_ids)
+        if doc_ids:
+            print(f"Removed {len(doc_ids)} documents of '{repo_full_name}' from the vector store.")
+        return len(doc_ids)
 
-vector_store = FAISSVectorStore(dimension=DEFAULT_EMBEDDING_DIMENSION)
+    def upsert_repo(self, repo_full_name: str, chunks: list[str], embeddings=None):
+        """
+        Replaces a repository's chunks with `chunks`, leaving other repositories as they are.
+        Embeddings are computed (if not given) before anything is removed, so a failed upsert keeps the old chunks.
+        """
+        valid_positions = [i for i, chunk in enumerate(chunks) if chunk and chunk.strip()]
+        if not valid_positions:
+            print(f"No valid chunks to upsert for '{repo_full_name}'.")
+            return False
+        if embeddings is not None and len(embeddings) != len(chunks):
+            print(f"Mismatch in number of precomputed embeddings ({len(embeddings)}) and chunks ({len(chunks)}). Aborting upsert.")
+            return False
+
+        valid_chunks = [chunks[i] for i in valid_positions]
+        if embeddings is not None:
+            embedded_positions = [i for i in valid_positions if embeddings[i] is not None]
+            if not embedded_positions:
+                print(f"No embedded chunks to upsert for '{repo_full_name}'.")
+                return False
+            if len(embedded_positions) != len(valid_positions):
+                print(f"Upserting '{repo_full_name}' without {len(valid_positions) - len(embedded_positions)} chunks that have no embedding.")
+            valid_chunks = [chunks[i] for i in embedded_positions]
+            valid_embeddings = [embeddings[i] for i in embedded_positions]
+        else:
+            embedding_results = get_embeddings_batch(valid_chunks)
+            embedded_positions = [i for i, vector in enumerate(embedding_results.get("embeddings") or []) if vector is not None]
+            if not embedded_positions:
+                print(f"Failed to generate embeddings for '{repo_full_name}': {embedding_results['error']}")
+                return False
+            if embedding_results["error"]:
+                print(f"Upserting '{repo_full_name}' without {len(valid_chunks) - len(embedded_positions)} chunks whose embedding failed: {embedding_results['error']}")
+            valid_chunks = [valid_chunks[i] for i in embedded_positions]
+            valid_embeddings = [embedding_results["embeddings"][i] for i in embedded_positions]
+        if len(valid_embeddings) != len(valid_chunks) or any(np.size(vector) != self.dimension for vector in valid_embeddings):
+            print(f"ERROR: Embeddings for '{repo_full_name}' do not match the chunks or the store dimension ({self.dimension}). Aborting upsert.")
+            return False
 
+        self.delete_repo(repo_full_name)
+        return self.add_documents([(chunk, repo_full_name) for chunk in valid_chunks], valid_embeddings)
 
-FAISS_INDEX_FILE = "faiss_index.bin"
-DOC_MAP_FILE = "doc_map.json" 
+    def reset_index(self):
+        """Resets all repository partitions and the chunk table."""
+        self.partitions.clear()
+        self.lexical_indexes.clear()
+        self.chunk_table.clear()
+        self.next_id = 0
+        print("Vector store index and chunk table have been reset.")
 
 
-def save_vector_store(vs_instance: FAISSVectorStore, index_path=FAISS_INDEX_FILE, map_path=DOC_MAP_FILE):
-    if not faiss or not vs_instance.index:
-        print("FAISS not available or index not initialized. Cannot save.")
-        return
+def save_vector_store(vs_instance: FAISSVectorStore, directory: str):
+    """
+    Saves a store's changes since its last save to `directory`: new chunks are appended, changed
+    partitions are rewritten, and the manifest is replaced atomically. No-op if nothing changed.
+    """
+    if not vs_instance.has_unsaved_changes() and os.path.exists(os.path.join(directory, "manifest.json")):
+        return True
     try:
-        print(f"Saving FAISS index to {index_path}...")
-        # faiss.write_index is synchronous
-        faiss.write_index(vs_instance.index, index_path)
-        
-        print(f"Saving document map to {map_path}...")
-        serializable_doc_map = {int(k): v for k, v in vs_instance.document_map.items()}
-        with open(map_path, 'w') as f:
-            json.dump({"next_id": vs_instance.next_id, "document_map": serializable_doc_map}, f)
-        print("Vector store saved successfully.")
+        started = time.time()
+        vs_instance.chunk_table, vs_instance.partitions = save_store_state(
+            directory, vs_instance.dimension, vs_instance.next_id, vs_instance.chunk_table, vs_instance.partitions,
+            compact_dead_fraction=VECTOR_STORE_COMPACT_DEAD_FRACTION,
+        )
+        print(f"Vector store saved to {directory} in {time.time() - started:.3f}s ({len(vs_instance.chunk_table)} documents).")
+        return True
     except Exception as e:
-        print(f"Error saving vector store: {e}")
-
-def load_vector_store(dimension=DEFAULT_EMBEDDING_DIMENSION, index_path=FAISS_INDEX_FILE, map_path=DOC_MAP_FILE):
-    global vector_store 
+        print(f"Error saving vector store to {directory}: {e}")
+        return False
 
-    if not faiss:
-        print("FAISS not available. Cannot load vector store. Using a new, empty store.")
-        vector_store = FAISSVectorStore(dimension=dimension) 
-        return vector_store
-
-    loaded_vs = FAISSVectorStore(dimension=dimension) 
-    
-    if os.path.exists(index_path) and os.path.exists(map_path):
-        try:
-            print(f"Loading FAISS index from {index_path}...")
-            # faiss.read_index is synchronous
-            loaded_vs.index = faiss.read_index(index_path) 
-            
-            print(f"Loading document map from {map_path}...")
-            with open(map_path, 'r') as f:
-                data = json.load(f)
-                loaded_vs.document_map = {int(k): v for k, v in data.get("document_map", {}).items()}
-                loaded_vs.next_id = data.get("next_id", 0)
-            
-            vector_store = loaded_vs 
-            print(f"Vector store loaded successfully. Index has {vector_store.index.ntotal} documents. Map has {len(vector_store.document_map)} entries. Next ID: {vector_store.next_id}")
-            
-        except Exception as e:
-            print(f"Error loading vector store: {e}. Using a new, empty store.")
-            vector_store.reset_index() 
-    else:
-        print(f"No saved vector store found (Checked for '{index_path}' and '{map_path}'). Using a new, empty store.")
-        vector_store.reset_index() 
+def load_vector_store(dimension=DEFAULT_EMBEDDING_DIMENSION, directory: str = None):
+    """Returns the store saved in `directory` (opened lazily), or a new, empty store."""
+    loaded_vs = FAISSVectorStore(dimension=dimension)
+    if not directory:
+        return loaded_vs
+    try:
+        state = load_store_state(directory, use_mmap=VECTOR_STORE_MMAP_INDEXES)
+    except Exception as e:
+        print(f"Error loading vector store from {directory}: {e}. Using a new, empty store.")
+        return loaded_vs
+    if state is None:
+        return loaded_vs
 
-    return vector_store
+    manifest, loaded_vs.chunk_table, loaded_vs.partitions = state
+    if manifest["dimension"] != dimension:
+        print(f"Saved vector store in {directory} has dimension {manifest['dimension']}, expected {dimension}. Using a new, empty store.")
+        return FAISSVectorStore(dimension=dimension)
+    loaded_vs.next_id = manifest["next_id"]
+    print(f"Vector store opened from {directory}: {len(loaded_vs.partitions)} partitions, {len(loaded_vs.chunk_table)} documents. Next ID: {loaded_vs.next_id}")
+    return loaded_vs